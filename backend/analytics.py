@@ -0,0 +1,366 @@
+"""Inquiry analytics for owners, from a columnar snapshot of ``inquiries``.
+
+:class:`InquiryAnalytics` keeps every inquiry as a row of four NumPy
+columns (listing, day received, lead time, nights requested), 16 bytes
+each, and answers ``GET /api/analytics/listings/{id}`` and
+``GET /api/analytics/categories`` with vectorized computations over them
+instead of aggregating the collection per request.
+
+The snapshot refreshes every ``ANALYTICS_REFRESH_SECONDS`` and only reads
+inquiries received since the previous refresh (by the ``created_at``/``id``
+index), re-reading a short overlap so inquiries written late by the
+buffered writer aren't missed. Confirmed bookings are few next to
+inquiries and change state, so their per-listing counts are re-aggregated
+each time.
+
+Columns are saved to ``ANALYTICS_STORE_DIR`` after every refresh, so a
+restart picks up where it stopped. Every worker keeps its own snapshot,
+but only the one holding the ``analytics-store`` lease writes the shared
+store, and columns and metadata go into a single file replaced in one
+rename, so a reader never pairs columns with another save's listing ids.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from database import Database
+from export import export_cursor
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_STORE_DIR = os.environ.get(
+    "ANALYTICS_STORE_DIR", os.path.join(os.path.dirname(__file__), "analytics_store")
+)
+REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_REFRESH_SECONDS", 60))
+# Inquiries may be written up to this long after their created_at
+LATE_WRITES = timedelta(seconds=60)
+BATCH_SIZE = 10000
+# Lease on writing the store; outlives a few missed refreshes
+STORE_LOCK = "analytics-store"
+DEFAULT_DAYS = 30
+MAX_DAYS = 365
+
+_COLUMNS = ("listing", "received", "lead", "nights")
+_FIELDS = ["id", "listing_id", "start_date", "end_date", "created_at"]
+_PROJECTION = {"_id": 0, **{name: 1 for name in _FIELDS}}
+
+
+def analytics_enabled() -> bool:
+    return os.environ.get("ANALYTICS", "on").lower() not in ("0", "off", "false")
+
+
+def day_number(value: datetime) -> int:
+    """Days since 1970-01-01 (UTC)."""
+    return int(np.datetime64(value.date(), "D").astype(np.int64))
+
+
+def _date(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def _summary(values: np.ndarray) -> Dict[str, Optional[float]]:
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"mean": None, "median": None, "p90": None}
+    mean, median, p90 = float(values.mean()), float(np.median(values)), float(np.percentile(values, 90))
+    return {"mean": round(mean, 2), "median": round(median, 2), "p90": round(p90, 2)}
+
+
+def inquiry_columns(inquiries: pd.DataFrame, codes: Dict[str, int]) -> Dict[str, np.ndarray]:
+    """Columns for a batch of inquiries, one per row of ``inquiries``.
+
+    ``codes`` maps listing ids to row numbers and gains the new ones.
+    Unparsable or out-of-order dates leave NaN in ``lead``/``nights``.
+    """
+    inverse, listing_ids = pd.factorize(inquiries["listing_id"])
+    lookup = np.fromiter((codes.setdefault(listing_id, len(codes)) for listing_id in listing_ids.tolist()),
+                         dtype=np.int32, count=len(listing_ids))
+    received = inquiries["created_at"].to_numpy().astype("datetime64[D]").astype(np.int32)
+    start, end = (
+        pd.to_datetime(inquiries[name], format="%Y-%m-%d", errors="coerce").to_numpy().astype("datetime64[D]")
+        for name in ("start_date", "end_date")
+    )
+    start_days = start.astype(np.int64).astype(np.float64)
+    end_days = end.astype(np.int64).astype(np.float64)
+    start_days[np.isnat(start)] = np.nan
+    end_days[np.isnat(end)] = np.nan
+    nights = end_days - start_days
+    nights[nights <= 0] = np.nan
+    return {
+        "listing": lookup[inverse],
+        "received": received,
+        "lead": (start_days - received).astype(np.float32),
+        "nights": nights.astype(np.float32),
+    }
+
+
+@dataclass
+class _Snapshot:
+    """Immutable view the routes read; each refresh swaps in a new one."""
+
+    listing: np.ndarray  # int32 listing code per inquiry
+    received: np.ndarray  # int32 day the inquiry came in
+    lead: np.ndarray  # float32 days from inquiry to start_date
+    nights: np.ndarray  # float32 nights requested
+    order: np.ndarray  # inquiry rows grouped by listing code
+    offsets: np.ndarray  # listing code -> its slice of ``order``
+    bookings: np.ndarray  # confirmed bookings per listing code
+    categories: List[Dict[str, Any]]
+    as_of: datetime
+
+
+class InquiryAnalytics:
+    def __init__(
+        self,
+        database: Database,
+        store_dir: Optional[str] = ANALYTICS_STORE_DIR,
+        refresh_interval: float = REFRESH_INTERVAL,
+    ):
+        self.database = database
+        self.store_dir = store_dir
+        self.refresh_interval = refresh_interval
+        self.snapshot: Optional[_Snapshot] = None
+        # Builder state, only touched by the refresh
+        self._columns = {name: np.empty(0, dtype=np.float32 if name in ("lead", "nights") else np.int32)
+                         for name in _COLUMNS}
+        self._codes: Dict[str, int] = {}
+        self._category: Dict[str, str] = {}  # listing id -> category
+        self._watermark: Optional[datetime] = None
+        self._recent: Dict[str, datetime] = {}  # ids inside the late-write overlap
+        self._task: Optional[asyncio.Task] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._generation = 0  # saves made by this store
+
+    @property
+    def rows(self) -> int:
+        return len(self._columns["listing"])
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self.store_dir:
+            # Let another worker take over saving straight away
+            await self.database.locks.release(STORE_LOCK, self._owner)
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(self.load)
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Inquiry analytics refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    # Building
+
+    def ingest(self, inquiries: List[Dict[str, Any]]) -> int:
+        """Append the inquiries not seen yet; returns how many were new."""
+        frame = pd.DataFrame.from_records(inquiries, columns=_FIELDS)
+        # The overlap re-reads inquiries from the end of the last refresh
+        if self._recent:
+            frame = frame[~frame["id"].isin(list(self._recent))]
+        if frame.empty:
+            return 0
+        batch = inquiry_columns(frame, self._codes)
+        for name in _COLUMNS:
+            self._columns[name] = np.concatenate([self._columns[name], batch[name]])
+        latest = frame["created_at"].max().to_pydatetime()
+        self._watermark = max(self._watermark or latest, latest)
+        # Only the ids the next overlap can return again are kept
+        horizon = self._watermark - LATE_WRITES
+        self._recent = {key: created_at for key, created_at in self._recent.items() if created_at >= horizon}
+        overlap = frame[frame["created_at"] >= horizon]
+        for key, created_at in zip(overlap["id"], overlap["created_at"]):
+            self._recent[key] = created_at.to_pydatetime()
+        return len(frame)
+
+    def build(self, bookings: Dict[str, int], now: Optional[datetime] = None) -> _Snapshot:
+        """Derive the read view from the columns and per-listing bookings."""
+        now = now or datetime.utcnow()
+        for listing_id in bookings:
+            self._codes.setdefault(listing_id, len(self._codes))
+        size = len(self._codes)
+        listing = self._columns["listing"]
+        order = np.argsort(listing, kind="stable")
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(listing, minlength=size), out=offsets[1:])
+        booked = np.zeros(size, dtype=np.int32)
+        for listing_id, count in bookings.items():
+            booked[self._codes[listing_id]] = count
+        snapshot = _Snapshot(
+            listing=listing,
+            received=self._columns["received"],
+            lead=self._columns["lead"],
+            nights=self._columns["nights"],
+            order=order,
+            offsets=offsets,
+            bookings=booked,
+            categories=self._category_rollups(booked, day_number(now)),
+            as_of=now,
+        )
+        self.snapshot = snapshot
+        return snapshot
+
+    def _category_rollups(self, booked: np.ndarray, today: int) -> List[Dict[str, Any]]:
+        names = sorted(set(self._category.values()) | {"unknown"})
+        index = {name: i for i, name in enumerate(names)}
+        category_of = np.zeros(len(self._codes), dtype=np.int16)
+        for listing_id, code in self._codes.items():
+            category_of[code] = index[self._category.get(listing_id, "unknown")]
+        category = category_of[self._columns["listing"]]
+        inquiries = np.bincount(category, minlength=len(names))
+        recent = np.bincount(category[self._columns["received"] > today - DEFAULT_DAYS], minlength=len(names))
+        bookings = np.bincount(category_of, weights=booked, minlength=len(names)).astype(np.int64)
+        medians = pd.DataFrame({
+            "category": category, "lead": self._columns["lead"], "nights": self._columns["nights"],
+        }).groupby("category").median()
+        rollups = []
+        for i, name in enumerate(names):
+            if not inquiries[i] and not bookings[i]:
+                continue
+            lead = medians["lead"].get(i, np.nan)
+            nights = medians["nights"].get(i, np.nan)
+            rollups.append({
+                "category": name,
+                "inquiries": int(inquiries[i]),
+                "inquiries_last_30_days": int(recent[i]),
+                "bookings": int(bookings[i]),
+                "conversion_rate": round(int(bookings[i]) / int(inquiries[i]), 4) if inquiries[i] else None,
+                "median_lead_time_days": None if np.isnan(lead) else float(lead),
+                "median_rental_nights": None if np.isnan(nights) else float(nights),
+            })
+        return rollups
+
+    async def refresh(self) -> int:
+        """Read new inquiries and current bookings and swap in a new snapshot."""
+        since = self._watermark - LATE_WRITES if self._watermark is not None else None
+        cursor = export_cursor(self.database.inquiries.collection, _PROJECTION, since, None, BATCH_SIZE)
+        added = 0
+        batch: List[Dict[str, Any]] = []
+        async for inquiry in cursor:
+            batch.append(inquiry)
+            if len(batch) >= BATCH_SIZE:
+                added += await self._ingest_batch(batch)
+                batch = []
+        added += await self._ingest_batch(batch)
+
+        bookings = await self.database.bookings.confirmed_counts()
+        await self._load_categories([listing_id for listing_id in bookings if listing_id not in self._codes])
+        for listing_id in bookings:
+            self._codes.setdefault(listing_id, len(self._codes))
+        await asyncio.to_thread(self.build, bookings)
+        if added and self.store_dir and await self._owns_store():
+            await asyncio.to_thread(self.save)
+        return added
+
+    async def _owns_store(self) -> bool:
+        ttl = timedelta(seconds=max(3 * self.refresh_interval, 60))
+        locks = self.database.locks
+        return await locks.renew(STORE_LOCK, self._owner, ttl) or await locks.acquire(STORE_LOCK, self._owner, ttl)
+
+    async def _ingest_batch(self, batch: List[Dict[str, Any]]) -> int:
+        if not batch:
+            return 0
+        # Listings change category rarely; re-read the ones with new inquiries
+        await self._load_categories({inquiry["listing_id"] for inquiry in batch})
+        return self.ingest(batch)
+
+    async def _load_categories(self, listing_ids: Iterable[str]) -> None:
+        listing_ids = list(listing_ids)
+        for start in range(0, len(listing_ids), BATCH_SIZE):
+            cursor = self.database.listings.collection.find(
+                {"id": {"$in": listing_ids[start:start + BATCH_SIZE]}}, {"_id": 0, "id": 1, "category": 1}
+            )
+            async for listing in cursor:
+                self._category[listing["id"]] = listing["category"]
+
+    # Reading
+
+    def listing_stats(self, listing_id: str, days: int = DEFAULT_DAYS, now: Optional[datetime] = None) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        now = now or datetime.utcnow()
+        first_day = day_number(now) - days + 1
+        code = self._codes.get(listing_id)
+        if code is None or code >= len(snapshot.offsets) - 1:
+            rows = np.empty(0, dtype=np.int64)
+            bookings = 0
+        else:
+            rows = snapshot.order[snapshot.offsets[code]:snapshot.offsets[code + 1]]
+            bookings = int(snapshot.bookings[code])
+        received = snapshot.received[rows]
+        in_window = received[received >= first_day] - first_day
+        per_day = np.bincount(in_window[in_window < days], minlength=days)
+        inquiries = len(rows)
+        return {
+            "listing_id": listing_id,
+            "as_of": snapshot.as_of,
+            "inquiries": inquiries,
+            "bookings": bookings,
+            "conversion_rate": round(bookings / inquiries, 4) if inquiries else None,
+            "inquiries_per_day": [
+                {"date": _date(first_day + offset), "count": int(count)} for offset, count in enumerate(per_day)
+            ],
+            "lead_time_days": _summary(snapshot.lead[rows]),
+            "rental_nights": _summary(snapshot.nights[rows]),
+        }
+
+    def category_stats(self) -> Dict[str, Any]:
+        return {"as_of": self.snapshot.as_of, "categories": self.snapshot.categories}
+
+    # Persistence
+
+    def _path(self) -> str:
+        return os.path.join(self.store_dir, "inquiries.npz")
+
+    def save(self) -> None:
+        """Write columns and metadata to one file, replaced atomically."""
+        path = self._path()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._generation += 1
+        meta = {
+            "generation": self._generation,
+            "rows": self.rows,
+            "listing_ids": sorted(self._codes, key=self._codes.get),
+            "categories": self._category,
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "recent": {key: created_at.isoformat() for key, created_at in self._recent.items()},
+        }
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as handle:
+            np.savez(handle, meta=np.array(json.dumps(meta)), **self._columns)
+        os.replace(temporary, path)
+
+    def load(self) -> bool:
+        """Restore saved columns; False if there are none (or they don't match)."""
+        if not self.store_dir:
+            return False
+        try:
+            with np.load(self._path(), allow_pickle=False) as saved:
+                meta = json.loads(str(saved["meta"]))
+                columns = {name: saved[name] for name in _COLUMNS}
+        except (OSError, ValueError, KeyError):
+            return False
+        if any(len(column) != meta["rows"] for column in columns.values()) or (
+            meta["rows"] and columns["listing"].max() >= len(meta["listing_ids"])
+        ):
+            logger.warning("Ignoring inconsistent analytics store in %s", self.store_dir)
+            return False
+        self._columns = columns
+        self._codes = {listing_id: code for code, listing_id in enumerate(meta["listing_ids"])}
+        self._category = meta["categories"]
+        self._watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+        self._recent = {key: datetime.fromisoformat(value) for key, value in meta["recent"].items()}
+        self._generation = meta["generation"]
+        return True
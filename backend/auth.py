@@ -0,0 +1,29 @@
+"""Admin credential for routes that rewrite or dump other users' data.
+
+Set ``ADMIN_TOKEN`` and send it as ``Authorization: Bearer <token>``.
+Without ``ADMIN_TOKEN`` those routes are closed to everyone; manage.py
+needs no token.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+
+
+def admin_token() -> Optional[str]:
+    return os.environ.get("ADMIN_TOKEN") or None
+
+
+async def _check_admin(request: Request) -> None:
+    expected = admin_token()
+    if expected is None:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), expected.encode()):
+        raise HTTPException(
+            status_code=401, detail="Admin credential required", headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+require_admin = Depends(_check_admin)
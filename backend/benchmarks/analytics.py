@@ -0,0 +1,135 @@
+"""Cost of the inquiry analytics at a million inquiries.
+
+Synthesizes inquiries spread over listings with a skewed popularity, then
+times each stage of :class:`analytics.InquiryAnalytics`: ingesting them in
+refresh-sized batches, building the read view, an incremental refresh of
+one more batch, and the two routes' computations. Per-listing stats are
+compared against the same numbers computed in plain Python from that
+listing's inquiries, which is what a per-request query would have to do
+once Mongo had returned them; both are checked to agree.
+
+    cd backend && python -m benchmarks.analytics --inquiries 1000000 --listings 20000
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+
+from analytics import BATCH_SIZE, DEFAULT_DAYS, InquiryAnalytics
+
+CATEGORIES = ["cars", "bikes", "houses", "boats", "planes", "yachts"]
+
+
+def make_inquiries(n: int, listing_ids: List[str], now: datetime, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    # A few listings draw most of the interest
+    weights = [1 / (rank + 1) for rank in range(len(listing_ids))]
+    listings = rng.choices(listing_ids, weights=weights, k=n)
+    inquiries = []
+    for listing_id in listings:
+        created_at = now - timedelta(seconds=rng.randrange(365 * 86400))
+        start = created_at.date() + timedelta(days=rng.randrange(1, 90))
+        inquiries.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "listing_id": listing_id,
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rng.randrange(1, 14))).isoformat(),
+            "created_at": created_at,
+        })
+    inquiries.sort(key=lambda inquiry: (inquiry["created_at"], inquiry["id"]))
+    return inquiries
+
+
+def naive_stats(inquiries: List[Dict[str, Any]], bookings: int, days: int, now: datetime) -> Dict[str, Any]:
+    """The per-listing numbers in plain Python, from that listing's documents."""
+    first_day = now.date() - timedelta(days=days - 1)
+    per_day = defaultdict(int)
+    leads, nights = [], []
+    for inquiry in inquiries:
+        received = inquiry["created_at"].date()
+        if received >= first_day:
+            per_day[received] += 1
+        start = date.fromisoformat(inquiry["start_date"])
+        end = date.fromisoformat(inquiry["end_date"])
+        leads.append((start - received).days)
+        if end > start:
+            nights.append((end - start).days)
+    return {
+        "inquiries": len(inquiries),
+        "conversion_rate": round(bookings / len(inquiries), 4) if inquiries else None,
+        "per_day": [per_day[first_day + timedelta(days=offset)] for offset in range(days)],
+        "lead_median": statistics.median(leads) if leads else None,
+        "nights_median": statistics.median(nights) if nights else None,
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(n: int, listing_count: int, samples: int) -> None:
+    now = datetime.utcnow()
+    rng = random.Random(1)
+    listing_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(listing_count)]
+    print(f"synthesizing {n} inquiries over {listing_count} listings...")
+    inquiries = make_inquiries(n, listing_ids, now)
+    extra = make_inquiries(BATCH_SIZE, listing_ids, now + timedelta(minutes=5), seed=1)
+    bookings = {listing_id: rng.randrange(5) for listing_id in listing_ids[::3]}
+
+    analytics = InquiryAnalytics(database=None, store_dir=None)
+    analytics._category = {listing_id: rng.choice(CATEGORIES) for listing_id in listing_ids}
+
+    start = time.perf_counter()
+    for offset in range(0, n, BATCH_SIZE):
+        analytics.ingest(inquiries[offset:offset + BATCH_SIZE])
+    ingest = time.perf_counter() - start
+    _, build = timed(analytics.build, bookings, now)
+    _, increment = timed(analytics.ingest, extra)
+    _, rebuild = timed(analytics.build, bookings, now)
+    column_mb = sum(column.nbytes for column in analytics._columns.values()) / 2**20
+    view_mb = (analytics.snapshot.order.nbytes + analytics.snapshot.offsets.nbytes) / 2**20
+
+    by_listing = defaultdict(list)
+    for inquiry in inquiries + extra:
+        by_listing[inquiry["listing_id"]].append(inquiry)
+    sampled = rng.sample(listing_ids[:100], min(samples // 2, 100)) + rng.sample(listing_ids, samples // 2)
+    vectorized, naive = [], []
+    for listing_id in sampled:
+        stats, seconds = timed(analytics.listing_stats, listing_id, DEFAULT_DAYS, now)
+        vectorized.append(seconds)
+        expected, seconds = timed(naive_stats, by_listing[listing_id], bookings.get(listing_id, 0), DEFAULT_DAYS, now)
+        naive.append(seconds)
+        assert stats["inquiries"] == expected["inquiries"], listing_id
+        assert stats["conversion_rate"] == expected["conversion_rate"], listing_id
+        assert [day["count"] for day in stats["inquiries_per_day"]] == expected["per_day"], listing_id
+        assert stats["lead_time_days"]["median"] == expected["lead_median"], listing_id
+        assert stats["rental_nights"]["median"] == expected["nights_median"], listing_id
+    _, categories = timed(analytics.category_stats)
+
+    print(f"{'stage':<34} {'time':>12}")
+    print(f"{'ingest, batches of %d' % BATCH_SIZE:<34} {ingest:>11.2f}s")
+    print(f"{'build read view':<34} {build * 1000:>10.1f}ms")
+    print(f"{'incremental refresh (ingest+build)':<34} {(increment + rebuild) * 1000:>10.1f}ms")
+    print(f"{'category rollups (served)':<34} {categories * 1e6:>10.1f}us")
+    vectorized_ms, naive_ms = np.percentile(vectorized, [50, 95]) * 1000, np.percentile(naive, [50, 95]) * 1000
+    print(f"\n{'listing stats':<34} {'p50':>10} {'p95':>10}")
+    print(f"{'vectorized':<34} {vectorized_ms[0]:>8.3f}ms {vectorized_ms[1]:>8.3f}ms")
+    print(f"{'plain Python per request':<34} {naive_ms[0]:>8.3f}ms {naive_ms[1]:>8.3f}ms")
+    print(f"\ncolumns {column_mb:.1f}MB, read view index {view_mb:.1f}MB for {analytics.rows} inquiries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inquiries", type=int, default=1_000_000)
+    parser.add_argument("--listings", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=200, help="listings to time stats for")
+    args = parser.parse_args()
+    main(args.inquiries, args.listings, args.samples)
@@ -0,0 +1,228 @@
+"""Latency and throughput benchmark for the API routes.
+
+Runs the FastAPI ``app`` in-process (no network), seeds each dataset size
+with :func:`seed.synthetic_listings` and drives concurrent requests at
+every route, reporting p50/p95/p99 latency, throughput and process memory.
+By default it runs against an in-memory mongomock database; pass
+``--mongo-url`` to use a real (ideally local) mongod instead, in a scratch
+database that is dropped afterwards.
+
+    cd backend && python -m benchmarks.load --sizes 1000 10000 --output bench.json
+    python -m benchmarks.load --compare bench.json       # diff against a previous run
+
+Routes whose queries mongomock can't execute ($text, $geoNear) are
+reported as unsupported rather than failing the run.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+import server
+from cache import response_cache
+from database import database
+from ratelimit import rate_limiter
+from seed import synthetic_listings
+
+SEED_BATCH = 5000
+
+# name -> (method, path builder, body builder); builders get the listing ids
+ROUTES: Dict[str, tuple] = {
+    "listings": ("GET", lambda ids, rng: "/api/listings", None),
+    "listings_category": ("GET", lambda ids, rng: f"/api/listings?category={rng.choice(CATEGORIES)}", None),
+    "listings_card_page": ("GET", lambda ids, rng: "/api/listings?view=card&limit=20", None),
+    "listing_detail": ("GET", lambda ids, rng: f"/api/listings/{rng.choice(ids)}", None),
+    "categories": ("GET", lambda ids, rng: "/api/categories", None),
+    "search": ("GET", lambda ids, rng: f"/api/search?q={rng.choice(SEARCH_TERMS)}", None),
+    "suggest": ("GET", lambda ids, rng: f"/api/suggest?q={rng.choice(SUGGEST_PREFIXES)}", None),
+    "nearby": ("GET", lambda ids, rng: "/api/listings/nearby?lat=34.05&lng=-118.24&radius_km=100", None),
+    "create_inquiry": ("POST", lambda ids, rng: "/api/inquiries", lambda ids, rng: {
+        "listing_id": rng.choice(ids),
+        "name": "Load Test",
+        "email": "load@test.com",
+        "phone": "555-0100",
+        "start_date": "2030-01-01",
+        "end_date": "2030-01-05",
+        "message": "benchmark",
+    }),
+}
+CATEGORIES = ["cars", "bikes", "houses", "boats", "planes", "yachts"]
+SEARCH_TERMS = ["yacht", "ferrari", "villa", "jet", "harley", "boat"]
+# Keystrokes as typed, typos included
+SUGGEST_PREFIXES = ["y", "ya", "yac", "yatc", "fer", "ferar", "vil", "vila", "mia", "harly"]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:  # not Linux: fall back to the peak
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if platform.system() == "Darwin" else peak / 2**10
+
+
+def make_client(mongo_url: Optional[str]):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        return AsyncIOMotorClient(mongo_url, **database.settings.client_options())
+    from mongomock_motor import AsyncMongoMockClient
+
+    return AsyncMongoMockClient()
+
+
+async def setup(size: int, mongo_url: Optional[str], db_name: str) -> List[str]:
+    database.close()
+    database.settings.db_name = db_name
+    database.connect(make_client(mongo_url))
+    await database.client.drop_database(db_name)
+
+    ids = []
+    batch = []
+    for listing in synthetic_listings(size):
+        batch.append(listing)
+        ids.append(listing["id"])
+        if len(batch) >= SEED_BATCH:
+            await database.listings.collection.insert_many(batch)
+            batch = []
+    if batch:
+        await database.listings.collection.insert_many(batch)
+
+    response_cache.clear()
+    await server.startup_event()
+    return ids
+
+
+async def drive(
+    client: httpx.AsyncClient, route: str, ids: List[str], total: int, concurrency: int
+) -> Dict[str, Any]:
+    method, path_for, body_for = ROUTES[route]
+    rng = random.Random(route)
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            path = path_for(ids, rng)
+            body = body_for(ids, rng) if body_for else None
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "route": route,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    # Every request comes from one client; 429s would be timed as responses
+    rate_limiter.enabled = False
+    if args.no_cache:
+        response_cache.max_entries = 0
+    results = []
+    transport = httpx.ASGITransport(app=server.app)
+    for size in args.sizes:
+        ids = await setup(size, args.mongo_url, args.db_name)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for route in args.routes:
+                # One probe request tells us whether the backend can serve it
+                try:
+                    await drive(client, route, ids, 1, 1)
+                except NotImplementedError as exc:
+                    results.append({"size": size, "route": route, "unsupported": str(exc)})
+                    print(f"{size:>9} {route:<20} unsupported by this backend")
+                    continue
+                result = {"size": size, **await drive(client, route, ids, args.requests, args.concurrency)}
+                results.append(result)
+                print(
+                    f"{size:>9} {route:<20} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+                    f"p99 {result['p99_ms']:>8.2f}ms  {result['throughput_rps']:>8.1f} rps  "
+                    f"{result['rss_mb']:>7.1f}MB  errors {result['errors']}"
+                )
+        if args.mongo_url:
+            await database.client.drop_database(args.db_name)
+        await server.shutdown_event()
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "backend": "mongod" if args.mongo_url else "mongomock",
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "response_cache": not args.no_cache,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        },
+        "results": results,
+    }
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Print the p95 and throughput change of every route/size in both runs."""
+    def key(result: Dict[str, Any]) -> tuple:
+        return result["size"], result["route"]
+
+    before = {key(r): r for r in previous["results"] if "p95_ms" in r}
+    print(f"\n{'size':>9} {'route':<20} {'p95 change':>11} {'rps change':>11}")
+    for result in current["results"]:
+        old = before.get(key(result))
+        if old is None or "p95_ms" not in result:
+            continue
+        p95 = (result["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rps = (result["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100
+        print(f"{result['size']:>9} {result['route']:<20} {p95:>+10.1f}% {rps:>+10.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--routes", nargs="+", default=list(ROUTES), choices=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=500, help="requests per route and size")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mongo-url", help="benchmark a real mongod instead of mongomock")
+    parser.add_argument("--db-name", default="rental_marketplace_bench")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="previous JSON results to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report)
+
+
+if __name__ == "__main__":
+    main()
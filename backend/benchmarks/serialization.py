@@ -0,0 +1,85 @@
+"""Per-item cost of rendering listing pages, before and after FastJSONResponse.
+
+"before" is what a ``response_model=List[Dict]`` route did: validate the
+documents against the response field, run ``jsonable_encoder`` and render
+with the stdlib ``JSONResponse``. "after" hands the documents straight to
+:class:`serialization.FastJSONResponse`. Both outputs are checked to be
+byte-identical.
+
+    cd backend && python -m benchmarks.serialization --items 50 200 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from serialization import FastJSONResponse
+
+LEGACY_FIELD = create_response_field(name="Response_get_listings", type_=List[Dict])
+
+
+def make_listings(n: int) -> List[Dict]:
+    now = datetime.utcnow().replace(microsecond=123000)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Luxury Yacht Charter #{i}",
+            "description": "Stunning luxury yacht perfect for parties, events, and ocean adventures. "
+                           "Includes crew and amenities.",
+            "category": "yachts",
+            "price_per_day": 2499.0 + i,
+            "location": "Miami, FL",
+            "images": ["https://images.pexels.com/photos/32619596/pexels-photo-32619596.jpeg"],
+            "specifications": {
+                "length": "60 feet",
+                "guests": 12,
+                "crew_included": True,
+                "amenities": ["Kitchen", "Bedrooms", "Entertainment System"],
+            },
+            "available": True,
+            "owner_name": "Ocean Dreams Charters",
+            "owner_contact": "info@oceandreams.com",
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+async def render_legacy(items: List[Dict]) -> bytes:
+    content = await serialize_response(field=LEGACY_FIELD, response_content=items)
+    return JSONResponse(content).body
+
+
+async def render_fast(items: List[Dict]) -> bytes:
+    return FastJSONResponse(items).body
+
+
+async def time_per_item(render, items: List[Dict], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await render(items)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+async def main(sizes: List[int], repeat: int) -> None:
+    print(f"{'items':>8} {'before us/item':>15} {'after us/item':>14} {'speedup':>8}")
+    for n in sizes:
+        items = make_listings(n)
+        assert await render_legacy(items) == await render_fast(items), "outputs differ"
+        before = await time_per_item(render_legacy, items, repeat)
+        after = await time_per_item(render_fast, items, repeat)
+        print(f"{n:>8} {before * 1e6:>15.2f} {after * 1e6:>14.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 200, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat))
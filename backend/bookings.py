@@ -0,0 +1,95 @@
+"""Availability calendar and booking holds.
+
+Every night a hold covers is a document in ``listing_days`` with a unique
+``(listing_id, day)`` index. That collection is the interval index: a hold
+is created by inserting its nights, which either all succeed or conflict,
+and "is this listing free between X and Y" is one probe of the
+``(listing_id, day)`` index, which listing pages run as an anti-join.
+Unconfirmed holds carry ``expires_at`` and stop counting once it passes;
+Mongo's TTL monitor deletes them shortly after.
+"""
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import Database
+from models import Hold
+
+HOLD_TTL = timedelta(minutes=int(os.environ.get("HOLD_TTL_MINUTES", 30)))
+MAX_STAY_NIGHTS = 365
+
+
+class BookingConflict(Exception):
+    """Some of the requested nights are already held or booked."""
+
+
+def _to_datetime(day: date) -> datetime:
+    # BSON has no date type; nights are stored as midnight UTC
+    return datetime(day.year, day.month, day.day)
+
+
+def parse_stay(start_date: str, end_date: str) -> Tuple[datetime, datetime]:
+    """Parse ``YYYY-MM-DD`` check-in/checkout dates into a night range.
+
+    Raises ``ValueError`` for malformed or out-of-order dates.
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    if end <= start:
+        raise ValueError("end_date must be after start_date")
+    if (end - start).days > MAX_STAY_NIGHTS:
+        raise ValueError(f"stays are limited to {MAX_STAY_NIGHTS} nights")
+    return _to_datetime(start), _to_datetime(end)
+
+
+def nights(start: datetime, end: datetime) -> List[datetime]:
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+async def create_hold(database: Database, inquiry: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Hold the inquiry's dates on its listing.
+
+    Raises ``ValueError`` for invalid dates and :class:`BookingConflict` if
+    any night is taken.
+    """
+    now = now or datetime.utcnow()
+    start, end = parse_stay(inquiry["start_date"], inquiry["end_date"])
+    if start < _to_datetime(now.date()):
+        raise ValueError("start_date is in the past")
+
+    hold = Hold(
+        listing_id=inquiry["listing_id"],
+        inquiry_id=inquiry["id"],
+        start_date=inquiry["start_date"],
+        end_date=inquiry["end_date"],
+        expires_at=now + HOLD_TTL,
+    )
+    claimed = await database.bookings.claim_days(hold.id, hold.listing_id, nights(start, end), hold.expires_at, now)
+    if not claimed:
+        raise BookingConflict("Those dates are no longer available")
+    hold_dict = hold.dict()
+    await database.bookings.insert_hold(hold_dict)
+    hold_dict.pop("_id", None)
+    return hold_dict
+
+
+async def confirm_booking(database: Database, hold: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """Turn an unexpired hold into a booking; ``False`` if it can't be."""
+    if hold["status"] != "held":
+        return False
+    start, end = parse_stay(hold["start_date"], hold["end_date"])
+    return await database.bookings.confirm(hold, len(nights(start, end)), now or datetime.utcnow())
+
+
+def free_between(database: Database, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+    """Stages for :meth:`ListingRepository.find_page` keeping listings free
+    for every night between the two dates."""
+    start, end = _to_datetime(start_date), _to_datetime(end_date)
+    return database.bookings.free_stages(start, end, datetime.utcnow())
+
+
+async def blocked_dates(database: Database, listing_id: str, start_date: date, end_date: date) -> List[str]:
+    """Nights of a listing that are held or booked, as ``YYYY-MM-DD``."""
+    start, end = _to_datetime(start_date), _to_datetime(end_date)
+    days = await database.bookings.blocked_days(listing_id, start, end, datetime.utcnow())
+    return [day.date().isoformat() for day in days]
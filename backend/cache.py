@@ -0,0 +1,201 @@
+"""In-process response cache for the read endpoints.
+
+Entries are keyed on the route plus its normalized query params, expire
+after a TTL and are evicted least-recently-used once the cache is full.
+Concurrent misses on the same key share one load (single flight), so a
+burst of identical requests costs one Mongo query. Every entry carries tags
+and listing writes invalidate by tag, so only affected entries are dropped.
+
+Writes made through other worker processes don't reach the listeners here;
+they show up as the shared listings version moving further than this
+process's own writes account for (:meth:`ResponseCache.observe_version`),
+and then the whole cache is dropped.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from database import ListingWrite
+
+# Tag on everything derived from the set of listings (pages, search, counts)
+LISTINGS_TAG = "listings"
+# Tag on listing pages filtered by free dates; holds invalidate it
+AVAILABILITY_TAG = "availability"
+
+
+def listing_tag(listing_id: str) -> str:
+    return f"listing:{listing_id}"
+
+
+def cache_key(route: str, **params: Any) -> str:
+    """Normalize params so equivalent requests share an entry."""
+    parts = []
+    for name in sorted(params):
+        value = params[name]
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(v) for v in value)
+        parts.append(f"{name}={value}")
+    return f"{route}?{'&'.join(parts)}"
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    tags: Iterable[str]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        default_ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._inflight: Dict[str, Tuple[asyncio.Future, Tuple[str, ...]]] = {}
+        # Listings version the entries were loaded under, and local writes since
+        self._version: Optional[int] = None
+        self._local_writes = 0
+        self._stats = {
+            "hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0, "invalidations": 0,
+            "version_clears": 0,
+        }
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.value
+            self._stats["expirations"] += 1
+            self._remove(key)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(inflight[0])
+
+        self._stats["misses"] += 1
+        tags = tuple(tags)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, tags)
+        try:
+            value = await loader()
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Waiters re-raise it; make sure an unawaited future doesn't warn
+            future.exception()
+            raise
+        else:
+            # An invalidation that raced with the load drops the key from
+            # ``_inflight``; the value may then be stale, so don't store it
+            if self._is_loading(key, future):
+                self._store(key, value, self.default_ttl if ttl is None else ttl, tags)
+            future.set_result(value)
+            return value
+        finally:
+            if self._is_loading(key, future):
+                del self._inflight[key]
+
+    def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                if key in self._entries:
+                    self._stats["invalidations"] += 1
+                    self._remove(key)
+        # Loads already running may have read pre-write data
+        stale = set(tags)
+        for key, (_, loading_tags) in list(self._inflight.items()):
+            if stale.intersection(loading_tags):
+                del self._inflight[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        # Loads already running won't store what they read
+        self._inflight.clear()
+
+    def note_local_write(self) -> None:
+        """Count a listing write this process invalidated for itself."""
+        self._local_writes += 1
+
+    def observe_version(self, version: int) -> None:
+        """Drop everything if ``version`` moved on by more than the local writes.
+
+        Each write bumps the version once, so any further bumps came from
+        writes in other processes, which this cache can't attribute to tags.
+        """
+        seen = self._version
+        if seen is not None and version <= seen:
+            return
+        if seen is not None and version - seen > self._local_writes:
+            self._stats["version_clears"] += 1
+            self.clear()
+        self._local_writes = max(0, self._local_writes - (version - seen)) if seen is not None else 0
+        self._version = version
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": round((self._stats["hits"] + self._stats["coalesced"]) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _is_loading(self, key: str, future: asyncio.Future) -> bool:
+        inflight = self._inflight.get(key)
+        return inflight is not None and inflight[0] is future
+
+    def _store(self, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value, self._clock() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._stats["evictions"] += 1
+            self._remove(oldest)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+def invalidation_listener(cache: ResponseCache):
+    """Listing write listener that drops the entries a write affects."""
+
+    async def on_write(write: ListingWrite) -> None:
+        cache.invalidate(LISTINGS_TAG, *(listing_tag(listing["id"]) for listing in write.listings))
+        cache.note_local_write()
+
+    return on_write
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024)),
+    default_ttl=float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 30)),
+)
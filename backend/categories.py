@@ -0,0 +1,78 @@
+"""Materialized category counters behind /api/categories.
+
+Counts of available listings per category live in the ``category_counts``
+collection, one small document per category. Listing inserts, upserts and
+updates adjust them with ``$inc``, so serving the endpoint reads a handful of
+documents instead of grouping the whole ``listings`` collection on every
+page load.
+"""
+from collections import Counter
+from typing import Any, Dict, List
+
+from database import Database, ListingWrite
+
+CATEGORY_INFO = {
+    "cars": {"name": "Cars", "icon": "🚗"},
+    "bikes": {"name": "Bikes", "icon": "🏍️"},
+    "houses": {"name": "Houses", "icon": "🏡"},
+    "boats": {"name": "Boats", "icon": "⛵"},
+    "planes": {"name": "Planes", "icon": "✈️"},
+    "yachts": {"name": "Yachts", "icon": "🛥️"},
+}
+
+
+async def rebuild_category_counts(database: Database) -> Dict[str, int]:
+    """Recount available listings per category and replace the counters.
+
+    This is both the bootstrap on startup and the repair path if the
+    counters ever drift from the collection.
+    """
+    pipeline = [
+        {"$match": {"available": True}},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+    ]
+    results = await database.listings.aggregate(pipeline)
+    counts = {result["_id"]: result["count"] for result in results}
+    await database.category_counts.replace_all(counts)
+    return counts
+
+
+def counter_listener(database: Database):
+    """Listing write listener that keeps the counters in step.
+
+    Inserts count their listings; upserts and updates move a listing's
+    count from its previous category/availability to the new one. An
+    update that wrote neither has no ``previous`` entry and changes nothing.
+    """
+
+    async def on_write(write: ListingWrite) -> None:
+        before = {doc["id"]: doc for doc in write.previous}
+        delta: Counter = Counter()
+        for listing in write.listings:
+            old = before.get(listing["id"])
+            if write.op == "update":
+                if old is None:
+                    continue
+                listing = {**old, **listing}
+            if listing.get("available", True):
+                delta[listing["category"]] += 1
+            if old is not None and old.get("available", True):
+                delta[old["category"]] -= 1
+        await database.category_counts.increment({category: n for category, n in delta.items() if n})
+
+    return on_write
+
+
+async def list_categories(database: Database) -> List[Dict[str, Any]]:
+    """Known categories with their counts, largest first."""
+    categories = []
+    for counter in await database.category_counts.all():
+        category = counter["_id"]
+        if category in CATEGORY_INFO:
+            categories.append({
+                "id": category,
+                "name": CATEGORY_INFO[category]["name"],
+                "icon": CATEGORY_INFO[category]["icon"],
+                "count": counter["count"],
+            })
+    return categories
@@ -0,0 +1,113 @@
+"""Conditional GETs for the listing read endpoints.
+
+ETags are derived from a version number that every listing write bumps,
+plus the request path and query string, so they are known before the route
+runs. A request whose ``If-None-Match`` carries the current tag is answered
+with an empty 304 without touching the route, the cache or the serializer.
+"""
+import hashlib
+import re
+from typing import Awaitable, Callable, Iterable, Optional, Pattern
+from urllib.parse import parse_qsl
+
+from database import Database, ListingWrite
+
+LISTINGS_VERSION = "listings"
+
+# Responses that only depend on the listings collection (not the live stream)
+ETAG_PATHS = re.compile(r"^/api/(listings(/(?!stream$)[^/]+)?|categories)$")
+# ...unless filtered on date availability, which holds change
+VERSIONLESS_PARAMS = ("available_from", "available_to")
+
+
+def make_etag(version: int, path: str, query_string: bytes) -> str:
+    # Weak, since the compression middleware around this one sends
+    # byte-different br, gzip and identity bodies under the same tag
+    digest = hashlib.blake2b(f"{path}?".encode() + query_string, digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _if_none_match(headers) -> set:
+    """The tags of ``If-None-Match`` without ``W/``, for weak comparison."""
+    for name, value in headers:
+        if name == b"if-none-match":
+            return {_opaque(tag.strip()) for tag in value.decode("latin-1").split(",")}
+    return set()
+
+
+class ETagMiddleware:
+    """ASGI middleware adding weak ETags and answering ``If-None-Match``."""
+
+    def __init__(
+        self,
+        app,
+        version: Callable[[], Awaitable[int]],
+        paths: Pattern = ETAG_PATHS,
+        versionless_params: Iterable[str] = VERSIONLESS_PARAMS,
+    ):
+        self.app = app
+        self.version = version
+        self.paths = paths
+        self.versionless_params = set(versionless_params)
+
+    def _applies(self, scope) -> bool:
+        if scope["type"] != "http" or scope["method"] != "GET" or not self.paths.match(scope["path"]):
+            return False
+        params = parse_qsl(scope["query_string"].decode("latin-1"))
+        return not any(name in self.versionless_params for name, _ in params)
+
+    async def __call__(self, scope, receive, send):
+        if not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        etag = make_etag(await self.version(), scope["path"], scope["query_string"])
+        headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        candidates = _if_none_match(scope["headers"])
+        if _opaque(etag) in candidates or "*" in candidates:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+async def written_version(database: Database, write: ListingWrite) -> int:
+    """The listings version ``write`` produced.
+
+    The first listener to ask bumps the version and records it on the
+    write, so each write bumps it once whatever order listeners run in.
+    """
+    if write.version is None:
+        write.version = await database.versions.bump(LISTINGS_VERSION)
+    return write.version
+
+
+async def version_after(database: Database, write: ListingWrite, previous: Optional[int]) -> Optional[int]:
+    """The version ``write`` produced if it is the only write since ``previous``.
+
+    ``None`` if other writes (e.g. another worker's) moved the version too,
+    so state built at ``previous`` can't be patched forward with this one.
+    """
+    version = await written_version(database, write)
+    if previous is None or version != previous + 1:
+        return None
+    return version
+
+
+def version_listener(database: Database):
+    """Listing write listener that moves the listings version forward."""
+
+    async def on_write(write: ListingWrite) -> None:
+        await written_version(database, write)
+
+    return on_write
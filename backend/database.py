@@ -0,0 +1,641 @@
+"""Async MongoDB data layer built on Motor.
+
+Route handlers never talk to a collection directly; they go through the
+repositories below so that every round trip is awaited on the event loop
+instead of blocking the worker.
+"""
+import math
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from facets import ATTRS_FIELD, spec_attrs
+from pagination import Page, after_cursor, keyset_filter, make_page, projection_for
+from search import SCORE_FIELD, SEARCH_SORT, TEXT_SCORE
+
+# Mongo's internal ``_id`` is never part of an API response
+NO_ID = {"_id": 0}
+
+# A whole listing as the API returns it
+LISTING_PROJECTION = projection_for(None, [])
+
+# Newest first; ``id`` makes the order total so keyset pages never skip
+LISTING_SORT = [("created_at", -1), ("id", -1)]
+
+# What a write listener is told about a listing as it was before the write
+PREVIOUS_FIELDS = ("id", "category", "available", "title", "location")
+
+# Scratch field of the availability anti-join (see BookingRepository.free_stages)
+BUSY_FIELD = "_busy"
+
+# Closest first for nearby searches; ``_distance`` is in metres
+NEARBY_SORT = [("_distance", 1), ("id", 1)]
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+@dataclass
+class MongoSettings:
+    """Connection and pool settings, overridable through the environment."""
+
+    url: str = "mongodb://localhost:27017"
+    db_name: str = "rental_marketplace"
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: int = 60000
+    wait_queue_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: int = 30000
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        return cls(
+            url=os.environ.get("MONGO_URL", cls.url),
+            db_name=os.environ.get("MONGO_DB_NAME", cls.db_name),
+            max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", cls.max_pool_size),
+            min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", cls.min_pool_size),
+            max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", cls.max_idle_time_ms),
+            wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", cls.wait_queue_timeout_ms),
+            server_selection_timeout_ms=_env_int(
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS", cls.server_selection_timeout_ms
+            ),
+            connect_timeout_ms=_env_int("MONGO_CONNECT_TIMEOUT_MS", cls.connect_timeout_ms),
+            socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", cls.socket_timeout_ms),
+        )
+
+    def client_options(self) -> Dict[str, Any]:
+        return {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+        }
+
+
+@dataclass
+class ListingWrite:
+    """A write that went through :class:`ListingRepository`."""
+
+    op: str  # "insert", "update" or "upsert"
+    listings: List[Dict[str, Any]]
+    # ``PREVIOUS_FIELDS`` of the listings that existed, for every "upsert"
+    # and for an "update" that writes one of those fields
+    previous: List[Dict[str, Any]] = field(default_factory=list)
+    # Listings version this write produced; see ``conditional.written_version``
+    version: Optional[int] = None
+
+
+WriteListener = Callable[[ListingWrite], Awaitable[None]]
+
+
+def _geo_near(
+    point: Dict[str, Any], query: Dict[str, Any], min_distance: Optional[float], max_distance: float
+) -> Dict[str, Any]:
+    geo_near: Dict[str, Any] = {
+        "near": point,
+        "key": "geo",
+        "distanceField": NEARBY_SORT[0][0],
+        "maxDistance": max_distance,
+        "query": query,
+        "spherical": True,
+    }
+    if min_distance is not None:
+        geo_near["minDistance"] = min_distance
+    return geo_near
+
+
+def _nearby_output(fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    return [
+        {"$addFields": {"distance_km": {"$round": [{"$divide": ["$_distance", 1000]}, 3]}}},
+        {"$project": projection_for(fields, NEARBY_SORT)},
+    ]
+
+
+class ListingRepository:
+    """Reads and writes against the ``listings`` collection.
+
+    Anything derived from listings (counters, caches) subscribes with
+    :meth:`add_listener` and is told about each write once it succeeded.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self._listeners: List[WriteListener] = []
+
+    def add_listener(self, listener: WriteListener) -> None:
+        self._listeners.append(listener)
+
+    async def _notify(self, write: ListingWrite) -> None:
+        for listener in self._listeners:
+            await listener(write)
+
+    async def count(self, query: Optional[Dict[str, Any]] = None) -> int:
+        return await self.collection.count_documents(query or {})
+
+    async def find_page(
+        self,
+        query: Dict[str, Any],
+        limit: int,
+        after: Optional[List[Any]] = None,
+        fields: Optional[List[str]] = None,
+        stages: Optional[List[Dict[str, Any]]] = None,
+    ) -> Page:
+        """A page of ``query`` newest first.
+
+        ``stages`` filter further on what a query can't see (see
+        :meth:`BookingRepository.free_stages`); they run on listings in page
+        order and stop once the page is full.
+        """
+        projection = projection_for(fields, LISTING_SORT)
+        if stages:
+            if fields is None:
+                projection[BUSY_FIELD] = 0
+            pipeline = [
+                {"$match": after_cursor(query, LISTING_SORT, after)},
+                {"$sort": dict(LISTING_SORT)},
+                *stages,
+                {"$limit": limit + 1},
+                {"$project": projection},
+            ]
+            docs = await self.collection.aggregate(pipeline).to_list(length=None)
+            return make_page(docs, limit, LISTING_SORT, fields)
+        cursor = self.collection.find(after_cursor(query, LISTING_SORT, after), projection).sort(LISTING_SORT)
+        return make_page(await cursor.limit(limit + 1).to_list(length=None), limit, LISTING_SORT, fields)
+
+    async def search_page(
+        self,
+        query: Dict[str, Any],
+        limit: int,
+        after: Optional[List[Any]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Page:
+        # The text score only exists inside the pipeline, so ranking and the
+        # keyset predicate on it have to run as an aggregation
+        pipeline: List[Dict[str, Any]] = [{"$match": query}, {"$addFields": {SCORE_FIELD: TEXT_SCORE}}]
+        if after is not None:
+            pipeline.append({"$match": keyset_filter(SEARCH_SORT, after)})
+        pipeline += [
+            {"$sort": dict(SEARCH_SORT)},
+            {"$limit": limit + 1},
+            {"$project": projection_for(fields, SEARCH_SORT)},
+        ]
+        docs = await self.collection.aggregate(pipeline).to_list(length=None)
+        return make_page(docs, limit, SEARCH_SORT, fields)
+
+    async def nearby_page(
+        self,
+        point: Dict[str, Any],
+        radius_m: float,
+        query: Dict[str, Any],
+        limit: int,
+        after: Optional[List[Any]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Page:
+        """A page of listings by distance, then ``id`` among equal distances.
+
+        $geoNear streams in distance order, so the work is bounded by the
+        page plus the listings tied at the distances the page starts and
+        ends at (listings geocoded to the same point), not by the radius.
+        """
+        if fields is not None:
+            fields = [*fields, "distance_km"]
+        wanted = limit + 1
+        docs: List[Dict[str, Any]] = []
+        min_distance = None
+        if after is not None:
+            # The rest of the ties at the cursor's distance, then only farther ones
+            distance, last_id = after
+            docs = await self._nearby_ties(point, {**query, "id": {"$gt": last_id}}, distance, wanted, fields)
+            min_distance = math.nextafter(distance, math.inf)
+        if len(docs) < wanted and (min_distance is None or min_distance <= radius_m):
+            docs += await self._nearby_after(point, radius_m, query, min_distance, wanted - len(docs), fields)
+        return make_page(docs, limit, NEARBY_SORT, fields)
+
+    async def _nearby_after(
+        self,
+        point: Dict[str, Any],
+        radius_m: float,
+        query: Dict[str, Any],
+        min_distance: Optional[float],
+        wanted: int,
+        fields: Optional[List[str]],
+    ) -> List[Dict[str, Any]]:
+        """The first ``wanted`` listings from ``min_distance`` on, in page order."""
+        geo_near = _geo_near(point, query, min_distance, radius_m)
+        # One more than needed tells whether the ties at the last distance
+        # were all emitted before it
+        pipeline = [{"$geoNear": geo_near}, {"$limit": wanted + 1}, *_nearby_output(fields)]
+        docs = await self.collection.aggregate(pipeline).to_list(length=None)
+        docs.sort(key=lambda doc: (doc["_distance"], doc["id"]))
+        if len(docs) <= wanted:
+            return docs
+        boundary = docs[wanted - 1]["_distance"]
+        if docs[wanted]["_distance"] > boundary:
+            return docs[:wanted]
+        # More listings may share the boundary distance; take its lowest ids
+        closer = [doc for doc in docs if doc["_distance"] < boundary]
+        return closer + await self._nearby_ties(point, query, boundary, wanted - len(closer), fields)
+
+    async def _nearby_ties(
+        self,
+        point: Dict[str, Any],
+        query: Dict[str, Any],
+        distance: float,
+        wanted: int,
+        fields: Optional[List[str]],
+    ) -> List[Dict[str, Any]]:
+        """Up to ``wanted`` listings at exactly ``distance``, by ``id``."""
+        pipeline = [
+            {"$geoNear": _geo_near(point, query, distance, distance)},
+            {"$sort": {"id": 1}},
+            {"$limit": wanted},
+            *_nearby_output(fields),
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def get(self, listing_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": listing_id}, LISTING_PROJECTION)
+
+    async def exists(self, listing_id: str) -> bool:
+        # Projecting only ``id`` lets the unique index cover the lookup
+        return await self.collection.find_one({"id": listing_id}, {"_id": 0, "id": 1}) is not None
+
+    async def existing_ids(self, listing_ids: List[str]) -> Set[str]:
+        cursor = self.collection.find({"id": {"$in": listing_ids}}, {"_id": 0, "id": 1})
+        return {doc["id"] async for doc in cursor}
+
+    async def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def insert_one(self, listing: Dict[str, Any]) -> None:
+        listing[ATTRS_FIELD] = spec_attrs(listing.get("specifications"))
+        await self.collection.insert_one(listing)
+        await self._notify(ListingWrite("insert", [listing]))
+
+    async def insert_many(self, listings: List[Dict[str, Any]]) -> None:
+        for listing in listings:
+            listing[ATTRS_FIELD] = spec_attrs(listing.get("specifications"))
+        await self.collection.insert_many(listings)
+        await self._notify(ListingWrite("insert", listings))
+
+    async def upsert_many(self, listings: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Insert or overwrite listings by id; return ``{position: error}`` for rejected ones.
+
+        ``created_at`` is only written on insert, so re-importing a listing
+        keeps its place in the newest-first order.
+        """
+        if not listings:
+            return {}
+        for listing in listings:
+            listing[ATTRS_FIELD] = spec_attrs(listing.get("specifications"))
+        previous = await self._previous([listing["id"] for listing in listings])
+        requests = [
+            UpdateOne(
+                {"id": listing["id"]},
+                {
+                    "$set": {key: value for key, value in listing.items() if key != "created_at"},
+                    "$setOnInsert": {"created_at": listing["created_at"]},
+                },
+                upsert=True,
+            )
+            for listing in listings
+        ]
+        failed: Dict[int, str] = {}
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as exc:
+            failed = {error["index"]: error.get("errmsg", "write failed") for error in exc.details["writeErrors"]}
+        written = [listing for position, listing in enumerate(listings) if position not in failed]
+        if written:
+            written_ids = {listing["id"] for listing in written}
+            await self._notify(
+                ListingWrite("upsert", written, [doc for doc in previous if doc["id"] in written_ids])
+            )
+        return failed
+
+    async def update_fields(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """``$set`` fields on several listings, keyed by listing id."""
+        if not updates:
+            return
+        for fields in updates.values():
+            if "specifications" in fields:
+                fields[ATTRS_FIELD] = spec_attrs(fields["specifications"])
+        previous = await self._previous(
+            [listing_id for listing_id, fields in updates.items() if not fields.keys().isdisjoint(PREVIOUS_FIELDS)]
+        )
+        await self.collection.bulk_write(
+            [UpdateOne({"id": listing_id}, {"$set": fields}) for listing_id, fields in updates.items()],
+            ordered=False,
+        )
+        await self._notify(
+            ListingWrite("update", [{"id": listing_id, **fields} for listing_id, fields in updates.items()], previous)
+        )
+
+    async def _previous(self, listing_ids: List[str]) -> List[Dict[str, Any]]:
+        if not listing_ids:
+            return []
+        projection = {"_id": 0, **{name: 1 for name in PREVIOUS_FIELDS}}
+        return await self.collection.find({"id": {"$in": listing_ids}}, projection).to_list(length=None)
+
+
+class CategoryCountRepository:
+    """Per-category count of available listings, kept in ``category_counts``."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def all(self) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"count": {"$gt": 0}}).sort([("count", -1), ("_id", 1)])
+        return await cursor.to_list(length=None)
+
+    async def increment(self, counts: Dict[str, int]) -> None:
+        for category, delta in counts.items():
+            await self.collection.update_one({"_id": category}, {"$inc": {"count": delta}}, upsert=True)
+
+    async def replace_all(self, counts: Dict[str, int]) -> None:
+        if counts:
+            await self.collection.bulk_write(
+                [ReplaceOne({"_id": category}, {"count": n}, upsert=True) for category, n in counts.items()]
+            )
+        await self.collection.delete_many({"_id": {"$nin": list(counts)}})
+
+
+class VersionRepository:
+    """Monotonic per-collection version numbers, kept in ``collection_versions``."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def get(self, name: str) -> int:
+        doc = await self.collection.find_one({"_id": name})
+        return doc["version"] if doc else 0
+
+    async def bump(self, name: str) -> int:
+        doc = await self.collection.find_one_and_update(
+            {"_id": name}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+
+def _active(now: datetime) -> Dict[str, Any]:
+    """Nights that are confirmed or held past ``now``."""
+    return {"$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]}
+
+
+class BookingRepository:
+    """Holds (``holds``) and the nights they claim (``listing_days``)."""
+
+    def __init__(self, holds: AsyncIOMotorCollection, days: AsyncIOMotorCollection):
+        self.holds = holds
+        self.days = days
+
+    async def claim_days(
+        self, hold_id: str, listing_id: str, days: List[datetime], expires_at: Optional[datetime], now: datetime
+    ) -> bool:
+        """Claim every night for ``hold_id`` or none of them.
+
+        The unique (listing_id, day) index makes each claim atomic, so two
+        overlapping requests can't both win a night. Nights are claimed in
+        date order and a losing request releases what it already took.
+        """
+        # Expired nights the TTL monitor hasn't reaped yet would still
+        # trip the unique index
+        await self.days.delete_many(
+            {"listing_id": listing_id, "day": {"$in": days}, "expires_at": {"$lte": now}}
+        )
+        try:
+            await self.days.insert_many(
+                [
+                    {"listing_id": listing_id, "day": day, "hold_id": hold_id, "expires_at": expires_at}
+                    for day in days
+                ],
+                ordered=True,
+            )
+        except BulkWriteError:
+            await self.days.delete_many({"hold_id": hold_id})
+            return False
+        return True
+
+    async def insert_hold(self, hold: Dict[str, Any]) -> None:
+        await self.holds.insert_one(hold)
+
+    async def get_hold(self, hold_id: str) -> Optional[Dict[str, Any]]:
+        return await self.holds.find_one({"id": hold_id}, NO_ID)
+
+    async def confirm(self, hold: Dict[str, Any], night_count: int, now: datetime) -> bool:
+        """Make an unexpired hold's nights permanent, then mark it confirmed.
+
+        The nights are confirmed first, in one update conditional on their
+        expiry: once the hold lapses ``claim_days`` may reap them for
+        another hold, so a hold only confirms if all ``night_count`` of its
+        nights were still its own. Each attempt tags the nights it took so
+        a failed one puts back only those, not a concurrent attempt's.
+        """
+        attempt = str(uuid.uuid4())
+        result = await self.days.update_many(
+            {"hold_id": hold["id"], "expires_at": {"$gt": now}},
+            {"$set": {"expires_at": None, "confirmation": attempt}},
+        )
+        if result.matched_count != night_count:
+            await self.days.update_many(
+                {"hold_id": hold["id"], "confirmation": attempt},
+                {"$set": {"expires_at": hold["expires_at"]}, "$unset": {"confirmation": ""}},
+            )
+            return False
+        result = await self.holds.update_one(
+            {"id": hold["id"], "status": "held"}, {"$set": {"status": "confirmed", "expires_at": None}}
+        )
+        return bool(result.modified_count)
+
+    async def release(self, hold_id: str) -> bool:
+        result = await self.holds.update_one(
+            {"id": hold_id, "status": {"$ne": "released"}}, {"$set": {"status": "released"}}
+        )
+        await self.days.delete_many({"hold_id": hold_id})
+        return bool(result.modified_count)
+
+    async def confirmed_counts(self) -> Dict[str, int]:
+        """Confirmed bookings per listing id."""
+        pipeline = [
+            {"$match": {"status": "confirmed"}},
+            {"$group": {"_id": "$listing_id", "count": {"$sum": 1}}},
+        ]
+        return {doc["_id"]: doc["count"] async for doc in self.holds.aggregate(pipeline)}
+
+    def free_stages(self, start: datetime, end: datetime, now: datetime) -> List[Dict[str, Any]]:
+        """Aggregation stages dropping listings with an active night in ``[start, end)``.
+
+        An anti-join: each listing reaching them probes the (listing_id, day)
+        index for one night, so the cost follows the listings read, not the
+        number of bookings in the window.
+        """
+        return [
+            {"$lookup": {
+                "from": self.days.name,
+                "let": {"listing_id": "$id"},
+                "pipeline": [
+                    {"$match": {
+                        "$expr": {"$eq": ["$listing_id", "$$listing_id"]},
+                        "day": {"$gte": start, "$lt": end},
+                        **_active(now),
+                    }},
+                    {"$limit": 1},
+                    {"$project": {"_id": 1}},
+                ],
+                "as": BUSY_FIELD,
+            }},
+            {"$match": {BUSY_FIELD: {"$size": 0}}},
+        ]
+
+    async def blocked_days(self, listing_id: str, start: datetime, end: datetime, now: datetime) -> List[datetime]:
+        cursor = self.days.find(
+            {"listing_id": listing_id, "day": {"$gte": start, "$lt": end}, **_active(now)},
+            {"_id": 0, "day": 1},
+        ).sort("day", 1)
+        return [doc["day"] async for doc in cursor]
+
+
+class InquiryRepository:
+    """Reads and writes against the ``inquiries`` collection."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def insert_one(self, inquiry: Dict[str, Any]) -> None:
+        await self.collection.insert_one(inquiry)
+
+    async def get(self, inquiry_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": inquiry_id}, NO_ID)
+
+    async def insert_many(self, inquiries: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Insert unordered; return ``{position: error}`` for rejected documents."""
+        try:
+            await self.collection.insert_many(inquiries, ordered=False)
+        except BulkWriteError as exc:
+            return {error["index"]: error.get("errmsg", "write failed") for error in exc.details["writeErrors"]}
+        return {}
+
+
+class ImageRepository:
+    """Source images processed into variants, keyed on their URL, in ``images``."""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def get_many(self, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self.collection.find({"_id": {"$in": list(set(urls))}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def save(self, url: str, record: Dict[str, Any]) -> None:
+        await self.collection.replace_one({"_id": url}, record, upsert=True)
+
+    async def clear_failures(self) -> int:
+        result = await self.collection.delete_many({"error": {"$exists": True}})
+        return result.deleted_count
+
+
+class LockRepository:
+    """Leased locks in ``locks``, shared by every process on the database.
+
+    A lock is a document keyed on its name; the unique ``_id`` makes taking
+    it atomic. A holder that dies without releasing only blocks others
+    until ``expires_at``.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def acquire(self, name: str, owner: str, ttl: timedelta, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.utcnow()
+        lock = {"owner": owner, "expires_at": now + ttl}
+        try:
+            await self.collection.insert_one({"_id": name, **lock})
+            return True
+        except DuplicateKeyError:
+            pass
+        # Take over a lock whose holder let the lease run out
+        taken = await self.collection.find_one_and_update(
+            {"_id": name, "expires_at": {"$lte": now}}, {"$set": lock}
+        )
+        return taken is not None
+
+    async def renew(self, name: str, owner: str, ttl: timedelta, now: Optional[datetime] = None) -> bool:
+        """Extend a lease ``owner`` still holds; False if it lost it."""
+        now = now or datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": name, "owner": owner, "expires_at": {"$gt": now}}, {"$set": {"expires_at": now + ttl}}
+        )
+        return result.matched_count == 1
+
+    async def release(self, name: str, owner: str) -> None:
+        await self.collection.delete_one({"_id": name, "owner": owner})
+
+
+class Database:
+    """Owns the Motor client and hands out repositories.
+
+    The client is created in :meth:`connect`, which the app calls on startup,
+    so it is always bound to the running event loop and each worker process
+    has its own; nothing connects at import time.
+    """
+
+    def __init__(self, settings: Optional[MongoSettings] = None):
+        self.settings = settings or MongoSettings.from_env()
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+        self.listings: Optional[ListingRepository] = None
+        self.inquiries: Optional[InquiryRepository] = None
+        self.category_counts: Optional[CategoryCountRepository] = None
+        self.versions: Optional[VersionRepository] = None
+        self.bookings: Optional[BookingRepository] = None
+        self.locks: Optional[LockRepository] = None
+        self.images: Optional[ImageRepository] = None
+        self._pid: Optional[int] = None
+
+    def connect(
+        self,
+        client: Optional[AsyncIOMotorClient] = None,
+        event_listeners: Sequence[Any] = (),
+    ) -> None:
+        """Create the client, or adopt ``client`` (e.g. a mongomock stand-in).
+
+        ``event_listeners`` are PyMongo monitoring listeners for the new client.
+        """
+        if self.client is not None and self._pid == os.getpid():
+            return
+        # A client inherited through fork() shares sockets with the parent
+        # and must not be used (or closed) here; each process makes its own
+        self._pid = os.getpid()
+        self.client = client or AsyncIOMotorClient(
+            self.settings.url, event_listeners=list(event_listeners), **self.settings.client_options()
+        )
+        self.db = self.client[self.settings.db_name]
+        self.listings = ListingRepository(self.db.listings)
+        self.inquiries = InquiryRepository(self.db.inquiries)
+        self.category_counts = CategoryCountRepository(self.db.category_counts)
+        self.versions = VersionRepository(self.db.collection_versions)
+        self.bookings = BookingRepository(self.db.holds, self.db.listing_days)
+        self.locks = LockRepository(self.db.locks)
+        self.images = ImageRepository(self.db.images)
+
+    def close(self) -> None:
+        if self.client is not None:
+            if self._pid == os.getpid():
+                self.client.close()
+            self.client = None
+
+
+database = Database()
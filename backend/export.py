@@ -0,0 +1,84 @@
+"""Streaming NDJSON/CSV export of whole collections.
+
+Documents are read from a Mongo cursor in ``batch_size`` batches and each
+batch is written out as one chunk, so memory stays at one batch whatever
+the collection size. ``StreamingResponse`` awaits every chunk's send
+before asking for the next, so a slow client pauses the cursor instead of
+letting rows pile up in memory.
+
+Rows come in ``(created_at, id)`` order. Passing the last row's
+``created_at`` as ``since`` and its ``id`` as ``after_id`` exports only
+what was added after it; ``since`` alone is fine when timestamps are
+known to be unique.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pagination import after_cursor
+from serialization import dumps
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+
+EXPORT_SORT = [("created_at", 1), ("id", 1)]
+
+LISTING_COLUMNS = [
+    "id", "title", "description", "category", "price_per_day", "location", "images",
+    "specifications", "available", "owner_name", "owner_contact", "geo", "created_at",
+]
+INQUIRY_COLUMNS = [
+    "id", "listing_id", "name", "email", "phone", "start_date", "end_date", "message", "created_at",
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def export_cursor(
+    collection, projection: Dict[str, Any], since: Optional[datetime], after_id: Optional[str], batch_size: int
+):
+    if since is None:
+        query: Dict[str, Any] = {}
+    elif after_id is None:
+        query = {"created_at": {"$gt": since}}
+    else:
+        query = after_cursor({}, EXPORT_SORT, [since, after_id])
+    return collection.find(query, projection).sort(EXPORT_SORT).batch_size(batch_size)
+
+
+def _ndjson_chunk(rows: List[Dict[str, Any]]) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    return value
+
+
+def _csv_chunk(rows: List[Dict[str, Any]], columns: List[str], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_cell(row.get(column)) for column in columns])
+    return buffer.getvalue().encode()
+
+
+async def stream_export(cursor, fmt: str, columns: List[str], batch_size: int) -> AsyncIterator[bytes]:
+    """Yield the cursor's documents as NDJSON or CSV, one chunk per batch."""
+    if fmt == "csv":
+        # The header goes out even for an empty export
+        yield _csv_chunk([], columns, header=True)
+    batch: List[Dict[str, Any]] = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield _csv_chunk(batch, columns, header=False) if fmt == "csv" else _ndjson_chunk(batch)
+            batch = []
+    if batch:
+        yield _csv_chunk(batch, columns, header=False) if fmt == "csv" else _ndjson_chunk(batch)
@@ -0,0 +1,183 @@
+"""Price and specification filters, and the facet counts behind /api/listings/facets.
+
+``specifications`` is a free-form dict that differs per category (seats,
+guests, passengers, ...), which no fixed set of indexes can cover. Each
+listing therefore also stores its specs in the attribute pattern: ``attrs``
+is a list of ``{"k": key, "v": value}`` pairs with lower-cased keys and
+string values, and numeric or boolean strings stored as such. One
+multikey index on ``attrs.k``/``attrs.v`` then serves a filter on any spec
+key.
+
+All facets come out of a single ``$facet`` aggregation over the filtered
+listings. Category and price counts ignore their own filter, so the
+client can show what picking another category or price band would give.
+"""
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from pymongo import ASCENDING, IndexModel
+
+ATTRS_FIELD = "attrs"
+
+# Lower bounds of the price histogram buckets; the last one is open-ended
+PRICE_BOUNDARIES = [0, 50, 100, 250, 500, 1000, 2500, 5000]
+MAX_SPEC_KEYS = 20
+MAX_SPEC_VALUES = 10
+
+ATTRS_INDEX = IndexModel(
+    [("available", ASCENDING), ("attrs.k", ASCENDING), ("attrs.v", ASCENDING)],
+    name="available_attrs",
+)
+PRICE_INDEX = IndexModel([("available", ASCENDING), ("price_per_day", ASCENDING)], name="available_price")
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        if value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        try:
+            number = float(value)
+        except ValueError:
+            return value.lower()
+        return int(number) if number.is_integer() else number
+    return value
+
+
+def spec_attrs(specifications: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """``specifications`` as indexed ``{"k", "v"}`` pairs."""
+    attrs = []
+    for key, value in (specifications or {}).items():
+        values = value if isinstance(value, list) else [value]
+        for item in values:
+            if item is None or isinstance(item, (dict, list)):
+                continue
+            attrs.append({"k": key.strip().lower(), "v": _normalize_value(item)})
+    return attrs
+
+
+def price_range(min_price: Optional[float], max_price: Optional[float]) -> Optional[Dict[str, float]]:
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price must not exceed max_price")
+    bounds = {}
+    if min_price is not None:
+        bounds["$gte"] = min_price
+    if max_price is not None:
+        bounds["$lte"] = max_price
+    return bounds or None
+
+
+def parse_spec_filters(specs: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Turn ``spec=`` params into ``$elemMatch`` clauses on ``attrs``.
+
+    ``seats:4`` and ``fuel_type:electric`` match a value (case-insensitive);
+    ``seats:4..``, ``seats:..8`` and ``seats:2..6`` match an inclusive range.
+    """
+    clauses = []
+    for raw in specs or []:
+        key, sep, value = raw.partition(":")
+        key = key.strip().lower()
+        if not sep or not key or not value.strip():
+            raise HTTPException(status_code=400, detail=f"Invalid spec filter {raw!r}, expected key:value")
+        if ".." in value:
+            low, _, high = value.partition("..")
+            bounds = {}
+            for op, bound in (("$gte", low.strip()), ("$lte", high.strip())):
+                if bound:
+                    number = _normalize_value(bound)
+                    if not isinstance(number, (int, float)) or isinstance(number, bool):
+                        raise HTTPException(status_code=400, detail=f"Spec range {raw!r} needs numbers")
+                    bounds[op] = number
+            if not bounds:
+                raise HTTPException(status_code=400, detail=f"Invalid spec filter {raw!r}")
+            match = {"k": key, "v": bounds}
+        else:
+            match = {"k": key, "v": _normalize_value(value)}
+        clauses.append({ATTRS_FIELD: {"$elemMatch": match}})
+    return clauses
+
+
+def facet_pipeline(
+    query: Dict[str, Any], category: Optional[str], price: Optional[Dict[str, float]]
+) -> List[Dict[str, Any]]:
+    """One aggregation computing every facet under ``query``.
+
+    ``query`` holds the filters every facet shares; the category and price
+    filters are applied per facet so neither narrows its own counts.
+    """
+    category_match = [{"$match": {"category": category}}] if category else []
+    price_match = [{"$match": {"price_per_day": price}}] if price else []
+    return [
+        {"$match": query},
+        {"$project": {
+            "_id": 0, "category": 1, "price_per_day": 1, ATTRS_FIELD: 1,
+            # Each key once per listing, even when it has several values
+            "spec_keys": {"$setUnion": ["$attrs.k", []]},
+        }},
+        {"$facet": {
+            "total": category_match + price_match + [{"$count": "count"}],
+            "categories": price_match + [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "price": category_match + [{"$bucket": {
+                "groupBy": "$price_per_day",
+                "boundaries": PRICE_BOUNDARIES,
+                "default": PRICE_BOUNDARIES[-1],
+                "output": {"count": {"$sum": 1}},
+            }}],
+            "spec_keys": category_match + price_match + [
+                {"$unwind": "$spec_keys"},
+                {"$group": {"_id": "$spec_keys", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": MAX_SPEC_KEYS},
+            ],
+            "spec_values": category_match + price_match + [
+                {"$unwind": f"${ATTRS_FIELD}"},
+                {"$group": {"_id": {"k": "$attrs.k", "v": "$attrs.v"}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id.v": 1}},
+                {"$group": {"_id": "$_id.k", "values": {"$push": {"value": "$_id.v", "count": "$count"}}}},
+                # Free-text specs can have a value per listing; trimming here
+                # keeps the $facet document under the 16MB limit
+                {"$project": {"values": {"$slice": ["$values", MAX_SPEC_VALUES]}}},
+            ],
+        }},
+    ]
+
+
+def format_facets(result: Dict[str, Any]) -> Dict[str, Any]:
+    upper = dict(zip(PRICE_BOUNDARIES, PRICE_BOUNDARIES[1:]))
+    values = {spec["_id"]: spec["values"] for spec in result["spec_values"]}
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "categories": [{"id": bucket["_id"], "count": bucket["count"]} for bucket in result["categories"]],
+        "price": [
+            {"min": bucket["_id"], "max": upper.get(bucket["_id"]), "count": bucket["count"]}
+            for bucket in result["price"]
+        ],
+        "specs": [
+            {"key": spec["_id"], "count": spec["count"], "values": values.get(spec["_id"], [])}
+            for spec in result["spec_keys"]
+        ],
+    }
+
+
+async def backfill_spec_attrs(database, batch_size: int = 1000) -> int:
+    """Derive ``attrs`` for listings stored before it existed.
+
+    Returns the number of listings updated.
+    """
+    updated = 0
+    updates: Dict[str, Dict[str, Any]] = {}
+    cursor = database.listings.collection.find(
+        {ATTRS_FIELD: {"$exists": False}}, {"_id": 0, "id": 1, "specifications": 1}
+    )
+    async for listing in cursor:
+        # update_fields derives attrs whenever specifications is written
+        updates[listing["id"]] = {"specifications": listing.get("specifications") or {}}
+        if len(updates) >= batch_size:
+            await database.listings.update_fields(updates)
+            updated += len(updates)
+            updates = {}
+    await database.listings.update_fields(updates)
+    return updated + len(updates)
@@ -0,0 +1,95 @@
+"""Offline geocoding for the free-text ``Listing.location`` strings.
+
+Listings are stored with a GeoJSON point in ``geo`` so nearby searches can
+use the 2dsphere index. Locations are "City, ST" strings; this table covers
+the cities listings are created in, and unknown locations simply get no
+point (they never show up in nearby results).
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# (latitude, longitude) of the city centre
+CITY_COORDINATES: Dict[str, Tuple[float, float]] = {
+    "albuquerque, nm": (35.0844, -106.6504),
+    "anchorage, ak": (61.2181, -149.9003),
+    "aspen, co": (39.1911, -106.8175),
+    "atlanta, ga": (33.7490, -84.3880),
+    "austin, tx": (30.2672, -97.7431),
+    "baltimore, md": (39.2904, -76.6122),
+    "boston, ma": (42.3601, -71.0589),
+    "charleston, sc": (32.7765, -79.9311),
+    "charlotte, nc": (35.2271, -80.8431),
+    "chicago, il": (41.8781, -87.6298),
+    "dallas, tx": (32.7767, -96.7970),
+    "denver, co": (39.7392, -104.9903),
+    "detroit, mi": (42.3314, -83.0458),
+    "fort lauderdale, fl": (26.1224, -80.1373),
+    "honolulu, hi": (21.3069, -157.8583),
+    "houston, tx": (29.7604, -95.3698),
+    "key west, fl": (24.5551, -81.7800),
+    "las vegas, nv": (36.1699, -115.1398),
+    "los angeles, ca": (34.0522, -118.2437),
+    "malibu, ca": (34.0259, -118.7798),
+    "miami, fl": (25.7617, -80.1918),
+    "minneapolis, mn": (44.9778, -93.2650),
+    "nashville, tn": (36.1627, -86.7816),
+    "new orleans, la": (29.9511, -90.0715),
+    "new york, ny": (40.7128, -74.0060),
+    "orlando, fl": (28.5383, -81.3792),
+    "palm springs, ca": (33.8303, -116.5453),
+    "philadelphia, pa": (39.9526, -75.1652),
+    "phoenix, az": (33.4484, -112.0740),
+    "portland, or": (45.5152, -122.6784),
+    "salt lake city, ut": (40.7608, -111.8910),
+    "san antonio, tx": (29.4241, -98.4936),
+    "san diego, ca": (32.7157, -117.1611),
+    "san francisco, ca": (37.7749, -122.4194),
+    "san jose, ca": (37.3382, -121.8863),
+    "santa barbara, ca": (34.4208, -119.6982),
+    "scottsdale, az": (33.4942, -111.9261),
+    "seattle, wa": (47.6062, -122.3321),
+    "tampa, fl": (27.9506, -82.4572),
+    "washington, dc": (38.9072, -77.0369),
+}
+
+
+def _normalize(location: str) -> str:
+    return re.sub(r"\s+", " ", location.strip().lower())
+
+
+def geocode(location: str) -> Optional[Tuple[float, float]]:
+    """``(lat, lng)`` for a "City, ST" location, or ``None`` if unknown."""
+    return CITY_COORDINATES.get(_normalize(location))
+
+
+def geo_point(lat: float, lng: float) -> Dict[str, Any]:
+    """GeoJSON point; note GeoJSON orders coordinates longitude first."""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def geocode_point(location: str) -> Optional[Dict[str, Any]]:
+    coordinates = geocode(location)
+    return geo_point(*coordinates) if coordinates else None
+
+
+async def backfill_coordinates(database, batch_size: int = 1000) -> int:
+    """Give every listing without a ``geo`` point one from its location.
+
+    Returns the number of listings that were geocoded.
+    """
+    geocoded = 0
+    updates: Dict[str, Dict[str, Any]] = {}
+    cursor = database.listings.collection.find(
+        {"geo": {"$exists": False}}, {"_id": 0, "id": 1, "location": 1}
+    )
+    async for listing in cursor:
+        point = geocode_point(listing.get("location", ""))
+        if point is None:
+            continue
+        updates[listing["id"]] = {"geo": point}
+        if len(updates) >= batch_size:
+            await database.listings.update_fields(updates)
+            geocoded += len(updates)
+            updates = {}
+    await database.listings.update_fields(updates)
+    return geocoded + len(updates)
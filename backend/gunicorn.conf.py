@@ -0,0 +1,35 @@
+"""Production launcher: ``gunicorn -c gunicorn.conf.py server:app``.
+
+Each worker is a separate process with its own event loop and Motor
+client (created on startup, never inherited through fork), so throughput
+scales with the number of workers up to the cores available. Response
+caches are per worker. A worker notices writes made through the others
+when it re-reads the shared listings version (at most a second later)
+and then drops its cached listing responses, so a body never goes out
+under an ETag newer than its data.
+
+Settings come from the environment: ``WEB_CONCURRENCY`` (workers,
+default one per core), ``HOST``/``PORT`` (default 0.0.0.0:8001) and
+``GUNICORN_TIMEOUT``. Rate limit buckets are per worker too unless
+``RATE_LIMIT_BACKEND=mongo``; ``FORWARDED_ALLOW_IPS`` lists the proxies
+whose ``X-Forwarded-For`` is trusted for the client IP.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '8001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app in each worker after the fork rather than in the master
+preload_app = False
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Trust X-Forwarded-For from these proxies, so rate limits key on real clients
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,313 @@
+"""Listing image pipeline: local content-addressed store and responsive variants.
+
+Every URL in ``Listing.images`` is fetched once, stored under the SHA-256
+of its bytes in ``IMAGE_STORE_DIR`` and resized to ``IMAGE_WIDTHS`` as
+WebP and JPEG. Listings then carry ``image_variants`` with ``srcset``
+strings pointing at ``/api/images/{digest}/{width}.{format}``. A digest
+names immutable content, so those responses are cacheable forever.
+
+Decoding and resizing is CPU-bound and runs in a process pool, off the
+event loop. Listings are queued by a write listener whenever their
+``images`` change, plus once at startup for listings that have no
+variants yet. A source that can't be fetched or decoded is recorded and
+skipped (its listing keeps serving the original URL).
+
+Listing data comes from API clients, so sources must be http(s) URLs on
+public addresses (optionally only ``IMAGE_ALLOWED_HOSTS``); redirects are
+checked the same way. ``file://`` URLs and local paths are only read when
+the pipeline is built with ``allow_local=True``, as the CLI does.
+
+Pillow is optional; without it the pipeline is off and stored variants
+are still served. With several hosts, point ``IMAGE_STORE_DIR`` at a
+shared volume.
+"""
+import asyncio
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from database import Database, ListingWrite
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional; no new variants without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", os.path.join(os.path.dirname(__file__), "image_store"))
+IMAGE_WIDTHS = (320, 640, 1280)
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+FETCH_TIMEOUT = 10
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Comma-separated hosts (and their subdomains) images may come from; empty allows any public host
+IMAGE_ALLOWED_HOSTS = tuple(
+    host.strip().lower() for host in os.environ.get("IMAGE_ALLOWED_HOSTS", "").split(",") if host.strip()
+)
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+VARIANT_FORMATS = (("webp", {"quality": 80, "method": 4}), ("jpg", {"quality": 82, "progressive": True}))
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_VARIANT = re.compile(r"^(\d+)\.(webp|jpg)$")
+
+
+def pipeline_enabled() -> bool:
+    return Image is not None and os.environ.get("IMAGE_PIPELINE", "on").lower() not in ("0", "off", "false")
+
+
+class UnsafeSource(ValueError):
+    """An image source the pipeline refuses to fetch."""
+
+
+def check_url(url: str, allowed_hosts: Sequence[str] = IMAGE_ALLOWED_HOSTS) -> None:
+    """Raise :class:`UnsafeSource` unless ``url`` is http(s) on a public address."""
+    parts = urllib.parse.urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise UnsafeSource(f"Only http(s) image URLs are accepted: {url}")
+    if allowed_hosts and not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts):
+        raise UnsafeSource(f"Image host is not allowed: {host}")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as exc:
+        raise UnsafeSource(f"Cannot resolve image host {host}: {exc}") from exc
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise UnsafeSource(f"Image host {host} resolves to a non-public address")
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_CheckedRedirects)
+
+
+def _fetch(source: str, allow_local: bool = False) -> bytes:
+    if source.startswith(("http://", "https://")):
+        check_url(source)
+        request = urllib.request.Request(source, headers={"User-Agent": "rental-marketplace-images"})
+        with _opener.open(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    elif allow_local:
+        path = source
+        if source.startswith("file://"):
+            path = urllib.request.url2pathname(urllib.parse.urlsplit(source).path)
+        with open(path, "rb") as handle:
+            data = handle.read(MAX_SOURCE_BYTES + 1)
+    else:
+        raise UnsafeSource(f"Only http(s) image URLs are accepted: {source}")
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError(f"Image is larger than {MAX_SOURCE_BYTES} bytes")
+    return data
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+
+
+def process_image(source: str, store_dir: str, widths: Sequence[int], allow_local: bool = False) -> Dict[str, Any]:
+    """Fetch ``source`` and write its variants; runs in a worker process.
+
+    Returns ``{"digest", "width", "height", "widths"}``. Content that was
+    processed before (under any URL) is not resized again. Nothing is
+    written for content that doesn't decode as an image.
+    """
+    data = _fetch(source, allow_local)
+    digest = hashlib.sha256(data).hexdigest()
+    folder = os.path.join(store_dir, digest[:2], digest)
+    meta_path = os.path.join(folder, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as handle:
+            return json.load(handle)
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.verify()  # raises on anything that isn't a well-formed image
+    # Built in a scratch folder and renamed into place, so a failure never
+    # leaves a partial folder behind
+    staging = f"{folder}.{os.getpid()}.tmp"
+    os.makedirs(staging, exist_ok=True)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            # Never upscale; a small source gets a single variant at its own width
+            targets = sorted({min(width, image.width) for width in widths})
+            for width in targets:
+                variant = image.copy()
+                variant.thumbnail((width, image.height), Image.LANCZOS)
+                for fmt, options in VARIANT_FORMATS:
+                    buffer = io.BytesIO()
+                    variant.save(buffer, "WEBP" if fmt == "webp" else "JPEG", **options)
+                    _write_atomic(os.path.join(staging, f"{width}.{fmt}"), buffer.getvalue())
+            meta = {"digest": digest, "width": image.width, "height": image.height, "widths": targets}
+        _write_atomic(os.path.join(staging, "original"), data)
+        _write_atomic(os.path.join(staging, "meta.json"), json.dumps(meta).encode())
+        if os.path.isdir(folder) and not os.path.exists(meta_path):
+            shutil.rmtree(folder, ignore_errors=True)  # left over by an interrupted run
+        try:
+            os.rename(staging, folder)
+        except OSError:
+            if not os.path.exists(meta_path):
+                raise
+            # Another process stored the same content first
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return meta
+
+
+def image_path(digest: str, name: str, store_dir: str = IMAGE_STORE_DIR) -> Optional[str]:
+    """Filesystem path of a stored variant, or None for a malformed name."""
+    if not _DIGEST.match(digest) or not _VARIANT.match(name):
+        return None
+    return os.path.join(store_dir, digest[:2], digest, name)
+
+
+def variant_url(digest: str, width: int, fmt: str) -> str:
+    return f"/api/images/{digest}/{width}.{fmt}"
+
+
+def image_variants(source: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    digest, widths = meta["digest"], meta["widths"]
+    return {
+        "original": source,
+        "width": meta["width"],
+        "height": meta["height"],
+        "thumbnail": variant_url(digest, widths[0], "webp"),
+        "webp_srcset": ", ".join(f"{variant_url(digest, width, 'webp')} {width}w" for width in widths),
+        "jpeg_srcset": ", ".join(f"{variant_url(digest, width, 'jpg')} {width}w" for width in widths),
+    }
+
+
+class ImagePipeline:
+    """Queue listings and build their ``image_variants`` in a process pool.
+
+    A listing is processed by one task at a time; if its images change
+    while it is being processed it is queued again afterwards, so the
+    last write always wins.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        store_dir: str = IMAGE_STORE_DIR,
+        workers: int = IMAGE_WORKERS,
+        widths: Sequence[int] = IMAGE_WIDTHS,
+        allow_local: bool = False,
+    ):
+        self.database = database
+        self.store_dir = store_dir
+        self.workers = workers
+        self.widths = tuple(widths)
+        # Read file:// and path sources; only for trusted (CLI) runs
+        self.allow_local = allow_local
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._queued: Set[str] = set()
+        self._active: Set[str] = set()
+        self._rerun: Set[str] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def enqueue(self, listing_id: str) -> None:
+        if listing_id in self._active:
+            self._rerun.add(listing_id)
+        elif listing_id not in self._queued:
+            self._queued.add(listing_id)
+            self._queue.put_nowait(listing_id)
+
+    def listener(self):
+        """Listing write listener that queues listings whose images changed."""
+
+        async def on_write(write: ListingWrite) -> None:
+            for listing in write.listings:
+                if "images" in listing:
+                    self.enqueue(listing["id"])
+
+        return on_write
+
+    async def enqueue_missing(self) -> int:
+        """Queue every listing that has no variants yet."""
+        cursor = self.database.listings.collection.find({"image_variants": {"$exists": False}}, {"_id": 0, "id": 1})
+        queued = 0
+        async for listing in cursor:
+            self.enqueue(listing["id"])
+            queued += 1
+        return queued
+
+    async def join(self) -> None:
+        """Wait until the queue is drained (for the CLI and tests)."""
+        while self._queued or self._active:
+            await self._queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            listing_id = await self._queue.get()
+            self._queued.discard(listing_id)
+            self._active.add(listing_id)
+            try:
+                await self.process_listing(listing_id)
+            except Exception:
+                logger.exception("Image processing failed for listing %s", listing_id)
+            finally:
+                self._active.discard(listing_id)
+                if listing_id in self._rerun:
+                    self._rerun.discard(listing_id)
+                    self.enqueue(listing_id)
+                self._queue.task_done()
+
+    async def _process_source(self, source: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        try:
+            meta = await loop.run_in_executor(
+                self._pool, process_image, source, self.store_dir, self.widths, self.allow_local
+            )
+        except Exception as exc:
+            logger.warning("Could not process image %s: %s", source, exc)
+            await self.database.images.save(source, {"error": str(exc), "failed_at": datetime.utcnow()})
+            return None
+        await self.database.images.save(source, {**meta, "processed_at": datetime.utcnow()})
+        return meta
+
+    async def process_listing(self, listing_id: str) -> None:
+        listing = await self.database.listings.get(listing_id)
+        if listing is None:
+            return
+        sources = listing.get("images") or []
+        known = await self.database.images.get_many(sources)
+        missing = [source for source in dict.fromkeys(sources) if source not in known]
+        processed = await asyncio.gather(*(self._process_source(source) for source in missing))
+        known.update((source, meta) for source, meta in zip(missing, processed) if meta)
+
+        variants = [image_variants(source, known[source]) for source in sources if "digest" in known.get(source, {})]
+        if variants != listing.get("image_variants"):
+            await self.database.listings.update_fields({listing_id: {"image_variants": variants}})
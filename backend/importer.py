@@ -0,0 +1,222 @@
+"""Bulk listing import from NDJSON or CSV.
+
+Input is read line by line and validated against ``Listing`` in chunks of
+``chunk_size`` rows. Each chunk goes to Mongo as one unordered
+``bulk_write`` of upserts keyed on ``id``, so memory stays at one chunk and
+importing the same file twice leaves the same catalogue.
+
+Rows are numbered from 0 in the order they appear (blank lines and the CSV
+header don't count). ``ImportReport.processed`` is the number of rows read
+so far; passing it back as ``skip`` resumes an interrupted import without
+redoing earlier chunks. Redoing them would also be harmless.
+
+CSV files use the column names of ``/api/export/listings?format=csv``, with
+``images``, ``specifications`` and ``geo`` as JSON cells; an export can be
+imported back unchanged.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from database import Database
+from geocoding import geocode_point
+from models import Listing
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+# The report keeps the first errors only; ``failed`` still counts them all
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("ndjson", "csv")
+
+# A parsed row, or the reason it couldn't be parsed
+Row = Union[Dict[str, Any], str]
+
+
+@dataclass
+class UndecodableLine:
+    """A body line that isn't valid UTF-8; the row parsers report it."""
+
+    number: int  # from 1, counting every line of the body
+    reason: str
+
+    def detail(self) -> str:
+        return f"Line {self.number} is not valid UTF-8: {self.reason}"
+
+
+Line = Union[str, UndecodableLine]
+
+
+@dataclass
+class ImportReport:
+    processed: int = 0
+    written: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add_error(self, index: int, listing_id: Optional[str], detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "listing_id": listing_id, "detail": detail})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "message": f"{self.written} listings imported, {self.failed} rejected",
+            "processed": self.processed,
+            "written": self.written,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def _decode(line: bytes, number: int) -> Line:
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        return UndecodableLine(number, f"{exc.reason} at byte {exc.start}")
+
+
+async def lines_from_chunks(chunks: AsyncIterable[bytes]) -> AsyncIterator[Line]:
+    """Split a byte stream (e.g. a request body) into decoded lines.
+
+    A line that isn't UTF-8 comes through as an :class:`UndecodableLine`
+    so the import rejects that row and carries on.
+    """
+    pending = b""
+    number = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            yield _decode(line + b"\n", number)
+    if pending:
+        yield _decode(pending, number + 1)
+
+
+async def ndjson_rows(lines: AsyncIterable[Line]) -> AsyncIterator[Row]:
+    async for line in lines:
+        if isinstance(line, UndecodableLine):
+            yield line.detail()
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield f"Invalid JSON: {exc}"
+            continue
+        yield row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def _csv_value(column: str, cell: str) -> Any:
+    if column in ("images", "specifications", "geo"):
+        return json.loads(cell)
+    return cell
+
+
+async def csv_rows(lines: AsyncIterable[Line]) -> AsyncIterator[Row]:
+    columns: Optional[List[str]] = None
+    record = ""
+    async for line in lines:
+        if isinstance(line, UndecodableLine):
+            # The bad line takes down the record it was part of
+            record = ""
+            yield line.detail()
+            continue
+        record += line
+        # A quoted cell may hold newlines; the record is complete once its
+        # quotes balance (embedded quotes are doubled, so parity holds)
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        cells = next(csv.reader([text]))
+        if columns is None:
+            columns = [column.strip() for column in cells]
+            continue
+        if len(cells) != len(columns):
+            yield f"Expected {len(columns)} cells, got {len(cells)}"
+            continue
+        try:
+            yield {column: _csv_value(column, cell) for column, cell in zip(columns, cells) if cell != ""}
+        except ValueError as exc:
+            yield f"Invalid JSON cell: {exc}"
+    if record.strip():
+        yield "Unterminated quoted cell"
+
+
+def parse_listing(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one row into a listing document; raises ``ValueError``."""
+    if not row.get("id"):
+        # Without an id a re-run would insert the row again
+        raise ValueError("id: Field required")
+    # image_variants is derived; the image pipeline redoes it for the row
+    listing = Listing(**row).dict(exclude={"image_variants"})
+    if listing["geo"] is None:
+        listing["geo"] = geocode_point(listing["location"])
+    return listing
+
+
+def _validation_detail(exc: ValueError) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+    return str(exc)
+
+
+async def _write_chunk(database: Database, chunk: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> None:
+    # The last row wins when a chunk repeats an id, as if written in order
+    latest = {listing["id"]: (index, listing) for index, listing in chunk}
+    rows = list(latest.values())
+    failed = await database.listings.upsert_many([listing for _, listing in rows])
+    for position, detail in failed.items():
+        index, listing = rows[position]
+        report.add_error(index, listing["id"], detail)
+    report.written += len(chunk) - len(failed)
+
+
+async def import_listings(
+    database: Database,
+    lines: AsyncIterable[Line],
+    format: str = "ndjson",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    skip: int = 0,
+    on_chunk: Optional[Callable[[ImportReport], Awaitable[None]]] = None,
+) -> ImportReport:
+    """Upsert every valid row, skipping the first ``skip`` rows.
+
+    ``on_chunk`` is awaited after each chunk is written, e.g. to save
+    ``report.processed`` as a checkpoint.
+    """
+    rows = csv_rows(lines) if format == "csv" else ndjson_rows(lines)
+    report = ImportReport()
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    index = -1
+    async for row in rows:
+        index += 1
+        if index < skip:
+            continue
+        report.processed = index + 1
+        if isinstance(row, str):
+            report.add_error(index, None, row)
+            continue
+        try:
+            chunk.append((index, parse_listing(row)))
+        except ValueError as exc:
+            report.add_error(index, row.get("id"), _validation_detail(exc))
+            continue
+        if len(chunk) >= chunk_size:
+            await _write_chunk(database, chunk, report)
+            chunk = []
+            if on_chunk:
+                await on_chunk(report)
+    if chunk:
+        await _write_chunk(database, chunk, report)
+    report.processed = max(report.processed, index + 1)
+    if on_chunk:
+        await on_chunk(report)
+    return report
@@ -0,0 +1,114 @@
+"""Index management: idempotent builds at startup and query plan reports."""
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo.errors import OperationFailure
+
+from database import LISTING_SORT
+from facets import facet_pipeline, parse_spec_filters
+from models import HOLD_INDEXES, INQUIRY_INDEXES, LISTING_DAY_INDEXES, LISTING_INDEXES
+from ratelimit import RATE_LIMIT_INDEXES
+from search import SEARCH_SORT, TEXT_SCORE, SCORE_FIELD, build_search_query
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_INDEXES = {
+    "listings": LISTING_INDEXES,
+    "inquiries": INQUIRY_INDEXES,
+    "holds": HOLD_INDEXES,
+    "listing_days": LISTING_DAY_INDEXES,
+    "rate_limits": RATE_LIMIT_INDEXES,
+}
+
+
+async def ensure_indexes(db) -> None:
+    """Build every declared index that is missing.
+
+    ``createIndexes`` is a no-op for an index that already exists with the
+    same spec, so this is safe to run on every startup. A conflicting spec
+    under the same name is logged rather than aborting startup; drop the old
+    index to let it be rebuilt.
+    """
+    for name, models in COLLECTION_INDEXES.items():
+        for model in models:
+            try:
+                await db[name].create_indexes([model])
+            except OperationFailure as exc:
+                logger.warning("Could not build index %s on %s: %s", model.document["name"], name, exc)
+
+
+def _route_queries() -> List[Tuple[str, Dict[str, Any]]]:
+    """The query each route runs, as (route, explainable command)."""
+    sample_id = "00000000-0000-0000-0000-000000000000"
+    search_pipeline = [
+        {"$match": build_search_query("yacht", "yachts")},
+        {"$addFields": {SCORE_FIELD: TEXT_SCORE}},
+        {"$sort": dict(SEARCH_SORT)},
+        {"$limit": 51},
+    ]
+    return [
+        ("GET /api/listings", {
+            "find": "listings", "filter": {"available": True},
+            "sort": dict(LISTING_SORT), "limit": 51,
+        }),
+        ("GET /api/listings?category=cars", {
+            "find": "listings", "filter": {"available": True, "category": "cars"},
+            "sort": dict(LISTING_SORT), "limit": 51,
+        }),
+        ("GET /api/listings?spec=seats:4..", {
+            "find": "listings", "filter": {"available": True, "$and": parse_spec_filters(["seats:4.."])},
+            "sort": dict(LISTING_SORT), "limit": 51,
+        }),
+        ("GET /api/listings/facets?spec=seats:4..", {
+            "aggregate": "listings", "cursor": {},
+            "pipeline": facet_pipeline({"available": True, "$and": parse_spec_filters(["seats:4.."])}, None, None),
+        }),
+        ("GET /api/listings/{id}", {
+            "find": "listings", "filter": {"id": sample_id}, "limit": 1,
+        }),
+        ("POST /api/inquiries (listing check)", {
+            "find": "listings", "filter": {"id": sample_id},
+            "projection": {"_id": 0, "id": 1}, "limit": 1,
+        }),
+        ("GET /api/search?q=yacht&category=yachts", {
+            "aggregate": "listings", "pipeline": search_pipeline, "cursor": {},
+        }),
+        ("inquiries by listing", {
+            "find": "inquiries", "filter": {"listing_id": sample_id},
+            "sort": {"created_at": -1},
+        }),
+    ]
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten a winning plan into ``STAGE(index)`` labels, innermost first."""
+    stages = []
+    while plan:
+        label = plan.get("stage", "?")
+        if plan.get("indexName"):
+            label += f"({plan['indexName']})"
+        stages.append(label)
+        inputs = plan.get("inputStages") or []
+        plan = plan.get("inputStage") or (inputs[0] if inputs else None)
+    return list(reversed(stages))
+
+
+def _winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"]["winningPlan"]
+    # Aggregations report the planner under their leading $cursor stage
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]["queryPlanner"]["winningPlan"]
+    return {}
+
+
+async def explain_routes(db) -> List[Tuple[str, List[str], Dict[str, Any]]]:
+    """Return ``(route, plan stages, raw explain)`` for every route query."""
+    reports = []
+    for route, command in _route_queries():
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        plan = _winning_plan(explain)
+        # Newer servers nest the classic plan under ``queryPlan``
+        reports.append((route, _plan_stages(plan.get("queryPlan", plan)), explain))
+    return reports
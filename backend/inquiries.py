@@ -0,0 +1,164 @@
+"""Batched inquiry ingestion.
+
+``ingest_inquiries`` backs ``POST /api/inquiries/bulk``: one ``$in`` query
+checks every listing id of the batch and one unordered ``insert_many``
+writes the valid inquiries. :class:`InquiryBuffer` is the optional buffered
+mode of ``POST /api/inquiries``, which queues inquiries and writes them in
+micro-batches from a single background task.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import PyMongoError
+
+from database import Database, InquiryRepository
+from models import Inquiry
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_INQUIRIES = 1000
+
+
+async def ingest_inquiries(database: Database, inquiries: List[Inquiry]) -> Dict[str, Any]:
+    """Write a batch of inquiries, reporting the ones that were rejected."""
+    listing_ids = list({inquiry.listing_id for inquiry in inquiries})
+    known = await database.listings.existing_ids(listing_ids)
+
+    errors = []
+    accepted: List[Dict[str, Any]] = []
+    positions = []
+    for index, inquiry in enumerate(inquiries):
+        if inquiry.listing_id not in known:
+            errors.append({"index": index, "inquiry_id": inquiry.id, "detail": "Listing not found"})
+            continue
+        accepted.append(inquiry.dict())
+        positions.append(index)
+
+    if accepted:
+        failed = await database.inquiries.insert_many(accepted)
+        for batch_index, detail in failed.items():
+            index = positions[batch_index]
+            errors.append({"index": index, "inquiry_id": inquiries[index].id, "detail": detail})
+
+    rejected = {error["index"] for error in errors}
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "message": f"{len(inquiries) - len(rejected)} of {len(inquiries)} inquiries submitted",
+        "inquiry_ids": [inquiry.id for index, inquiry in enumerate(inquiries) if index not in rejected],
+        "errors": errors,
+    }
+
+
+class BufferClosed(Exception):
+    """The inquiry buffer is shutting down and takes no more inquiries."""
+
+
+class InquiryBuffer:
+    """Queue inquiries and persist them with ``insert_many`` in micro-batches.
+
+    A batch is written once ``max_batch`` inquiries are waiting or
+    ``flush_interval`` seconds after its first inquiry arrived, whichever
+    comes first. The queue is bounded by ``max_pending`` so a stalled
+    database pushes back on callers instead of growing memory. ``close``
+    stops intake and drains whatever is queued before the process exits.
+
+    A submitted inquiry can't be read back until its batch is written;
+    :meth:`wait_written` lets a route that needs it wait for that.
+    """
+
+    def __init__(
+        self,
+        repository: InquiryRepository,
+        max_batch: int = 500,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+    ):
+        self.repository = repository
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # Inquiry id -> resolved once its batch was written (or dropped)
+        self._unwritten: Dict[str, asyncio.Future] = {}
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, inquiry: Dict[str, Any]) -> None:
+        """Queue one inquiry.
+
+        Raises ``asyncio.QueueFull`` when saturated and :class:`BufferClosed`
+        once :meth:`close` has started.
+        """
+        if self._closing:
+            raise BufferClosed("inquiry buffer is shutting down")
+        self._queue.put_nowait(inquiry)
+        self._unwritten.setdefault(inquiry["id"], asyncio.get_running_loop().create_future())
+
+    async def wait_written(self, inquiry_id: str, timeout: float = 5.0) -> bool:
+        """Wait for a queued inquiry's batch to be written.
+
+        Returns ``False`` at once if the inquiry isn't queued here. Raises
+        ``asyncio.TimeoutError`` if the write takes longer than ``timeout``.
+        """
+        written = self._unwritten.get(inquiry_id)
+        if written is None:
+            return False
+        await asyncio.wait_for(asyncio.shield(written), timeout)
+        return True
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting inquiries and flush everything still queued."""
+        self._closing = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Inquiry buffer still held %d inquiries at shutdown", self._queue.qsize())
+        self._task.cancel()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for inquiry in batch:
+                    written = self._unwritten.pop(inquiry["id"], None)
+                    if written is not None and not written.done():
+                        written.set_result(None)
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                failed = await self.repository.insert_many(batch)
+            except PyMongoError:
+                if attempt == self.max_retries:
+                    logger.exception("Dropping %d buffered inquiries after %d retries", len(batch), attempt)
+                    return
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+                continue
+            for index, detail in failed.items():
+                logger.error("Buffered inquiry %s rejected: %s", batch[index].get("id"), detail)
+            return
+
+
+def buffering_enabled() -> bool:
+    return os.environ.get("INQUIRY_BUFFERING", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,236 @@
+"""Live listing updates for ``GET /api/listings/stream`` (server-sent events).
+
+One :class:`ListingHub` per process watches the ``listings`` collection and
+fans each change out to every connected client, so a thousand open streams
+cost one upstream watcher, and every event is serialized once.
+
+The hub follows a MongoDB change stream when the server supports one
+(replica sets and sharded clusters). A standalone ``mongod`` has none; the
+hub then polls for listings with a newer ``created_at`` and also publishes
+the writes this process makes itself, as a write listener, because polling
+only sees inserts.
+
+Events carry deltas only: an insert or replace sends the listing, an update
+sends the id and the top-level fields that changed. Each event has an id,
+and a client reconnecting with ``Last-Event-ID`` gets what it missed from a
+short replay buffer, or a ``reset`` event (refetch the list) if that is no
+longer possible.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import Database, ListingWrite
+from facets import ATTRS_FIELD
+from pagination import after_cursor
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("LISTING_STREAM_POLL_SECONDS", 2))
+HEARTBEAT_INTERVAL = 15.0
+REPLAY_EVENTS = 1000
+# Events a client may fall behind before it is sent ``reset`` and dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+# Retry delay for the upstream watcher after an error
+RETRY_DELAY = 5.0
+
+POLL_SORT = [("created_at", 1), ("id", 1)]
+# Fields never sent to clients
+_PRIVATE_FIELDS = {"_id", ATTRS_FIELD}
+
+# Change streams need a replica set; a standalone mongod answers with this
+_NO_CHANGE_STREAMS = 40573
+
+RESET_EVENT = b"event: reset\ndata: {}\n\n"
+
+
+def _public(listing: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in listing.items() if key not in _PRIVATE_FIELDS}
+
+
+class _Subscriber:
+    def __init__(self):
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class ListingHub:
+    """Fan listing changes out to stream subscribers."""
+
+    def __init__(self, database: Database, poll_interval: float = POLL_INTERVAL):
+        self.database = database
+        self.poll_interval = poll_interval
+        # Event ids are only meaningful to the process that issued them
+        self.hub_id = uuid.uuid4().hex[:8]
+        self.mode: Optional[str] = None  # "change_stream" or "polling"
+        self._seq = 0
+        self._replay: Deque[Tuple[int, bytes]] = deque(maxlen=REPLAY_EVENTS)
+        self._subscribers: Set[_Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+        # Ids this process published as inserts, so polling doesn't repeat them
+        self._published_inserts: "OrderedDict[str, None]" = OrderedDict()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    # Publishing
+
+    def publish(self, event: str, payload: Dict[str, Any]) -> None:
+        self._seq += 1
+        frame = f"id: {self.hub_id}-{self._seq}\nevent: {event}\ndata: ".encode() + dumps(payload) + b"\n\n"
+        self._replay.append((self._seq, frame))
+        for subscriber in list(self._subscribers):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Never let one slow client hold the others back
+                subscriber.overflowed = True
+
+    def _publish_insert(self, listing: Dict[str, Any]) -> None:
+        if listing["id"] in self._published_inserts:
+            return
+        self._published_inserts[listing["id"]] = None
+        if len(self._published_inserts) > REPLAY_EVENTS:
+            self._published_inserts.popitem(last=False)
+        self.publish("listing", {"op": "insert", "listing": _public(listing)})
+
+    def _publish_update(self, listing_id: str, fields: Dict[str, Any], removed: List[str] = ()) -> None:
+        fields = _public(fields)
+        removed = [name for name in removed if name not in _PRIVATE_FIELDS]
+        if fields or removed:
+            self.publish("listing", {"op": "update", "id": listing_id, "fields": fields, "removed": removed})
+
+    def listener(self):
+        """Listing write listener publishing this process's writes.
+
+        Only used when polling; a change stream already reports them.
+        """
+
+        async def on_write(write: ListingWrite) -> None:
+            if self.mode != "polling":
+                return
+            existed = {doc["id"] for doc in write.previous}
+            for listing in write.listings:
+                if write.op == "insert" or (write.op == "upsert" and listing["id"] not in existed):
+                    self._publish_insert(listing)
+                else:
+                    fields = {name: value for name, value in listing.items() if name not in ("id", "created_at")}
+                    self._publish_update(listing["id"], fields)
+
+        return on_write
+
+    # Subscribing
+
+    async def stream(self, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """SSE frames for one client, until it disconnects."""
+        subscriber = _Subscriber()
+        self._subscribers.add(subscriber)
+        # Taken together with subscribing, so no event is both replayed and queued
+        missed = self._missed(last_event_id) if last_event_id else []
+        try:
+            yield f"retry: {int(RETRY_DELAY * 1000)}\n\n".encode()
+            for frame in missed:
+                yield frame
+            while not subscriber.overflowed:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+            yield RESET_EVENT
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _missed(self, last_event_id: str) -> List[bytes]:
+        hub_id, _, seq = last_event_id.partition("-")
+        if hub_id != self.hub_id or not seq.isdigit():
+            return [RESET_EVENT]
+        seq = int(seq)
+        if seq >= self._seq:
+            return []
+        if not self._replay or self._replay[0][0] > seq + 1:
+            return [RESET_EVENT]
+        return [frame for event_seq, frame in self._replay if event_seq > seq]
+
+    # Upstream
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self._follow_change_stream()
+            except OperationFailure as exc:
+                if exc.code == _NO_CHANGE_STREAMS:
+                    logger.info("No change streams on this deployment; polling listings instead")
+                    break
+                logger.warning("Listing change stream failed, retrying: %s", exc)
+            except PyMongoError as exc:
+                logger.warning("Listing change stream interrupted, retrying: %s", exc)
+            except Exception:
+                # e.g. a client stand-in without change stream support
+                logger.exception("Could not watch listings; polling instead")
+                break
+            await asyncio.sleep(RETRY_DELAY)
+        await self._poll()
+
+    async def _follow_change_stream(self) -> None:
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        async with self.database.listings.collection.watch(
+            pipeline, full_document="updateLookup", resume_after=self._resume_token
+        ) as changes:
+            self.mode = "change_stream"
+            async for change in changes:
+                self._resume_token = change["_id"]
+                self._on_change(change)
+
+    def _on_change(self, change: Dict[str, Any]) -> None:
+        document = change.get("fullDocument")
+        if not document:
+            # Updated and deleted again before the lookup
+            return
+        if change["operationType"] == "insert":
+            self._publish_insert(document)
+        elif change["operationType"] == "replace":
+            self.publish("listing", {"op": "replace", "listing": _public(document)})
+        else:
+            description = change.get("updateDescription", {})
+            # Dotted paths (images.1) are sent as their whole top-level field
+            changed = {path.split(".")[0] for path in description.get("updatedFields", {})}
+            removed = [path for path in description.get("removedFields", []) if "." not in path]
+            self._publish_update(document["id"], {name: document.get(name) for name in changed}, removed)
+
+    async def _poll(self) -> None:
+        self.mode = "polling"
+        collection = self.database.listings.collection
+        # Start from the newest existing listing; only later ones are news
+        newest = await collection.find({}, {"_id": 0, "created_at": 1, "id": 1}).sort(
+            [("created_at", -1), ("id", -1)]
+        ).limit(1).to_list(length=1)
+        after = [newest[0]["created_at"], newest[0]["id"]] if newest else [datetime.min, ""]
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                cursor = collection.find(after_cursor({}, POLL_SORT, after), {"_id": 0}).sort(POLL_SORT)
+                async for listing in cursor:
+                    after = [listing["created_at"], listing["id"]]
+                    self._publish_insert(listing)
+            except PyMongoError as exc:
+                logger.warning("Polling listings failed: %s", exc)
@@ -0,0 +1,142 @@
+"""Management commands for the rental marketplace backend.
+
+Run from the backend directory, e.g. ``python manage.py explain``.
+"""
+import asyncio
+import json
+import os
+
+import typer
+
+from categories import counter_listener, rebuild_category_counts
+from conditional import version_listener
+from database import database
+from images import ImagePipeline, pipeline_enabled
+from importer import DEFAULT_CHUNK_SIZE, FORMATS, import_listings
+from indexes import ensure_indexes, explain_routes
+
+cli = typer.Typer(help="Rental marketplace management commands")
+
+
+def _run(coro):
+    async def runner():
+        database.connect()
+        try:
+            return await coro()
+        finally:
+            database.close()
+
+    return asyncio.run(runner())
+
+
+@cli.command()
+def build_indexes():
+    """Build any declared index that is missing."""
+    _run(lambda: ensure_indexes(database.db))
+    typer.echo("Indexes are up to date")
+
+
+@cli.command()
+def explain(verbose: bool = typer.Option(False, help="Print the full explain() output")):
+    """Print the query plan each route's query gets."""
+    reports = _run(lambda: explain_routes(database.db))
+    for route, stages, raw in reports:
+        typer.echo(f"{route}\n  {' -> '.join(stages) or 'no plan reported'}")
+        if verbose:
+            typer.echo(json.dumps(raw, indent=2, default=str))
+
+
+@cli.command()
+def rebuild_categories():
+    """Recount available listings per category from scratch."""
+    counts = _run(lambda: rebuild_category_counts(database))
+    for category, count in sorted(counts.items()):
+        typer.echo(f"{category}: {count}")
+
+
+async def _file_lines(path: str):
+    with open(path, encoding="utf-8", newline="") as handle:
+        for line in handle:
+            yield line
+
+
+@cli.command("import-listings")
+def import_listings_command(
+    path: str,
+    format: str = typer.Option(None, help="ndjson or csv; guessed from the file extension by default"),
+    chunk_size: int = typer.Option(DEFAULT_CHUNK_SIZE, help="Rows validated and written per bulk write"),
+    resume: bool = typer.Option(True, help="Continue from the checkpoint a previous run left behind"),
+):
+    """Upsert listings from an NDJSON or CSV file, keyed on id.
+
+    Progress is checkpointed to PATH.checkpoint after every chunk, so an
+    interrupted import picks up where it stopped when run again.
+    """
+    format = format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    if format not in FORMATS:
+        raise typer.BadParameter(f"format must be one of {', '.join(FORMATS)}")
+    checkpoint = f"{path}.checkpoint"
+    skip = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as handle:
+            skip = int(handle.read().strip() or 0)
+        typer.echo(f"Resuming after row {skip}")
+
+    async def save_checkpoint(report):
+        with open(checkpoint, "w") as handle:
+            handle.write(str(report.processed))
+
+    async def run():
+        database.listings.add_listener(counter_listener(database))
+        database.listings.add_listener(version_listener(database))
+        return await import_listings(
+            database, _file_lines(path), format, chunk_size=chunk_size, skip=skip, on_chunk=save_checkpoint
+        )
+
+    report = _run(run)
+    os.remove(checkpoint)
+    for error in report.errors:
+        typer.echo(f"row {error['index']} ({error['listing_id']}): {error['detail']}", err=True)
+    typer.echo(f"{report.written} listings imported, {report.failed} rejected, {report.processed} rows read")
+
+
+@cli.command()
+def process_images(retry_failed: bool = typer.Option(False, help="Try sources that failed before again")):
+    """Build image variants for every listing that has none yet."""
+    if not pipeline_enabled():
+        raise typer.BadParameter("the image pipeline needs Pillow (and IMAGE_PIPELINE not off)")
+
+    async def run():
+        if retry_failed:
+            await database.images.clear_failures()
+            await database.listings.collection.update_many({"image_variants": []}, {"$unset": {"image_variants": ""}})
+        pipeline = ImagePipeline(database, allow_local=True)
+        pipeline.start()
+        try:
+            queued = await pipeline.enqueue_missing()
+            await pipeline.join()
+        finally:
+            await pipeline.close()
+        return queued
+
+    queued = _run(run)
+    typer.echo(f"Processed images of {queued} listings")
+
+
+@cli.command()
+def serve(
+    workers: int = typer.Option(None, help="Worker processes; defaults to WEB_CONCURRENCY or one per core"),
+    bind: str = typer.Option(None, help="host:port to listen on; defaults to HOST:PORT or 0.0.0.0:8001"),
+):
+    """Run the API under gunicorn with one uvicorn worker per process."""
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+    argv = ["gunicorn", "--config", config]
+    if workers:
+        argv += ["--workers", str(workers)]
+    if bind:
+        argv += ["--bind", bind]
+    os.execvp("gunicorn", argv + ["server:app"])
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,329 @@
+"""Request and MongoDB instrumentation, exported in Prometheus text format.
+
+``MetricsMiddleware`` times every request per route template and counts
+response bytes. ``MongoCommandMetrics`` is a PyMongo ``CommandListener``
+that times each command (find, aggregate, insert, ...), counts the
+documents it returned or wrote and logs commands slower than
+``MONGO_SLOW_QUERY_MS``. ``PoolMetrics`` tracks connection checkouts so
+``/api/health`` can report pool saturation.
+
+PyMongo calls listeners from Motor's worker threads, so every metric
+guards its state with a lock.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DOCUMENT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 10000)
+
+SLOW_QUERY_MS = float(os.environ.get("MONGO_SLOW_QUERY_MS", 100))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (per-bucket counts, +Inf count, sum)
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, value_sum) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', repr(float(bound)))])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', '+Inf')])} {total}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {value_sum}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {total}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.read():
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", LATENCY_BUCKETS
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "Response body size as sent, by route template", SIZE_BUCKETS
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by command and collection", LATENCY_BUCKETS
+)
+mongo_documents_returned = Histogram(
+    "mongo_documents_returned", "Documents returned per cursor batch", DOCUMENT_BUCKETS
+)
+mongo_documents_written = Counter("mongo_documents_written_total", "Documents inserted, updated or deleted")
+mongo_command_failures = Counter("mongo_command_failures_total", "MongoDB commands that failed")
+mongo_slow_commands = Counter("mongo_slow_commands_total", "MongoDB commands slower than MONGO_SLOW_QUERY_MS")
+rate_limited = Counter("http_rate_limited_total", "Requests answered 429 by a per-client limit")
+requests_shed = Counter("http_requests_shed_total", "Requests answered 503 by admission control")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and response size per route.
+
+    Pass the app's ``router`` so responses sent before routing (304s from
+    ETagMiddleware, 503s from admission control) are still labelled with
+    the route they were for.
+    """
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router
+
+    def _route_path(self, scope) -> str:
+        # FastAPI stores the matched route in the scope; using its path
+        # template keeps ids out of the label values
+        route = scope.get("route")
+        if route is None and self.router is not None:
+            route = next(
+                (candidate for candidate in self.router.routes if candidate.matches(scope)[0] == Match.FULL), None
+            )
+        return getattr(route, "path", "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        sent = 0
+
+        async def measuring_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, measuring_send)
+        finally:
+            labels = {
+                "route": self._route_path(scope),
+                "method": scope["method"],
+                "status": str(status),
+            }
+            http_request_duration.observe(time.perf_counter() - start, **labels)
+            http_response_size.observe(sent, **labels)
+
+
+# Handshake and housekeeping commands aren't worth a series
+_IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "endSessions", "saslStart", "saslContinue"}
+_WRITE_COMMANDS = {"insert", "update", "delete"}
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._pending: Dict[Tuple[int, object], str] = {}  # (request, connection) -> collection
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        with self._lock:
+            self._pending[(event.request_id, event.connection_id)] = (
+                collection if isinstance(collection, str) else event.database_name
+            )
+
+    def _finish(self, event) -> Optional[str]:
+        with self._lock:
+            return self._pending.pop((event.request_id, event.connection_id), None)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._finish(event)
+        if collection is None:
+            return
+        labels = {"command": event.command_name, "collection": collection}
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe(seconds, **labels)
+
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if isinstance(cursor, dict):
+            batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+            mongo_documents_returned.observe(len(batch), **labels)
+        elif event.command_name in _WRITE_COMMANDS:
+            mongo_documents_written.inc(reply.get("n", 0), **labels)
+
+        if seconds * 1000 >= self.slow_query_ms:
+            mongo_slow_commands.inc(**labels)
+            logger.warning(
+                "Slow MongoDB %s on %s took %.1fms", event.command_name, collection, seconds * 1000
+            )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._finish(event)
+        if collection is None:
+            return
+        labels = {"command": event.command_name, "collection": collection}
+        mongo_command_duration.observe(event.duration_micros / 1e6, **labels)
+        mongo_command_failures.inc(**labels)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connections open and checked out, per server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open: Dict[str, int] = {}
+        self.checked_out: Dict[str, int] = {}
+
+    def _add(self, counts: Dict[str, int], address, delta: int) -> None:
+        server = f"{address[0]}:{address[1]}"
+        with self._lock:
+            counts[server] = counts.get(server, 0) + delta
+
+    def in_use(self) -> int:
+        with self._lock:
+            return sum(self.checked_out.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"open": dict(self.open), "checked_out": dict(self.checked_out)}
+
+    def connection_created(self, event):
+        self._add(self.open, event.address, 1)
+
+    def connection_closed(self, event):
+        self._add(self.open, event.address, -1)
+
+    def connection_checked_out(self, event):
+        self._add(self.checked_out, event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._add(self.checked_out, event.address, -1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+
+command_metrics = MongoCommandMetrics()
+pool_metrics = PoolMetrics()
+
+
+def _pool_series(kind: str):
+    def read():
+        return [((("server", server),), count) for server, count in sorted(pool_metrics.snapshot()[kind].items())]
+
+    return read
+
+
+mongo_pool_open = Gauge("mongo_pool_connections_open", "Open MongoDB connections", _pool_series("open"))
+mongo_pool_checked_out = Gauge(
+    "mongo_pool_connections_checked_out", "MongoDB connections in use", _pool_series("checked_out")
+)
+
+REGISTRY = [
+    http_request_duration,
+    http_response_size,
+    mongo_command_duration,
+    mongo_documents_returned,
+    mongo_documents_written,
+    mongo_command_failures,
+    mongo_slow_commands,
+    rate_limited,
+    requests_shed,
+    mongo_pool_open,
+    mongo_pool_checked_out,
+]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,138 @@
+"""Document models and the indexes their query paths rely on.
+
+Each ``*_INDEXES`` list sits next to the model it belongs to so that a new
+query shape and the index that serves it are reviewed together. They are
+built idempotently at startup by :func:`indexes.ensure_indexes`.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+import uuid
+
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+
+from facets import ATTRS_INDEX, PRICE_INDEX
+from search import TEXT_INDEX
+
+
+class GeoPoint(BaseModel):
+    type: Literal["Point"] = "Point"
+    coordinates: List[float]  # [longitude, latitude]
+
+
+class ImageVariants(BaseModel):
+    """Resized copies of one of ``Listing.images``, ready for ``<picture>``."""
+
+    original: str
+    width: int
+    height: int
+    thumbnail: str
+    webp_srcset: str
+    jpeg_srcset: str
+
+
+class Listing(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    title: str
+    description: str
+    category: str  # cars, bikes, houses, boats, planes, yachts
+    price_per_day: float
+    location: str
+    images: List[str] = []
+    specifications: Dict[str, Any] = {}
+    available: bool = True
+    owner_name: str
+    owner_contact: str
+    geo: Optional[GeoPoint] = None
+    # Filled in by the image pipeline (images.py), in the order of images
+    image_variants: List[ImageVariants] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+LISTING_INDEXES = [
+    # get_listing, create_inquiry's existence check (covered by the index)
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    # get_listings without a category: equality on available, then the page sort
+    IndexModel(
+        [("available", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        name="available_created_at",
+    ),
+    # get_listings with a category filter
+    IndexModel(
+        [("available", ASCENDING), ("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        name="available_category_created_at",
+    ),
+    # search_listings
+    TEXT_INDEX,
+    # get_nearby_listings ($geoNear)
+    IndexModel([("geo", GEOSPHERE), ("category", ASCENDING)], name="geo_2dsphere_category"),
+    # export_listings, incremental by created_at
+    IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    # get_listings / get_listing_facets with spec= and price filters
+    ATTRS_INDEX,
+    PRICE_INDEX,
+]
+
+
+class Category(BaseModel):
+    """One entry of ``GET /api/categories`` (documentation only)."""
+
+    id: str
+    name: str
+    icon: str
+    count: int
+
+
+class Inquiry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    listing_id: str
+    name: str
+    email: str
+    phone: str
+    start_date: str
+    end_date: str
+    message: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+INQUIRY_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    # Inquiries for a listing, newest first
+    IndexModel([("listing_id", ASCENDING), ("created_at", DESCENDING)], name="listing_id_created_at"),
+    # export_inquiries, incremental by created_at
+    IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+]
+
+
+class Hold(BaseModel):
+    """A time-limited reservation of a listing's dates, made from an inquiry.
+
+    Holds expire unless confirmed. ``start_date`` is the first night and
+    ``end_date`` the checkout day, which stays free.
+    """
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    listing_id: str
+    inquiry_id: str
+    start_date: str
+    end_date: str
+    status: Literal["held", "confirmed", "released"] = "held"
+    expires_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+HOLD_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("inquiry_id", ASCENDING)], name="inquiry_id"),
+    # Confirmed bookings per listing, for the analytics refresh
+    IndexModel([("status", ASCENDING), ("listing_id", ASCENDING)], name="status_listing_id"),
+]
+
+# One document per (listing, night) a hold covers; see bookings.py
+LISTING_DAY_INDEXES = [
+    # The conflict check: a night can only be claimed by one hold
+    IndexModel([("listing_id", ASCENDING), ("day", ASCENDING)], name="listing_day_unique", unique=True),
+    IndexModel([("hold_id", ASCENDING)], name="hold_id"),
+    # Mongo reaps expired holds; confirmed nights have no expires_at
+    IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+]
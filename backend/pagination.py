@@ -0,0 +1,153 @@
+"""Keyset pagination and field projection for the list endpoints.
+
+Pages are walked with an opaque cursor holding the sort key of the last
+item served, so fetching page N costs the same index seek as page 1 and a
+request never holds more than ``limit`` documents in memory. The cursor for
+the next page is returned in the ``X-Next-Cursor`` response header, which
+keeps the response body the plain JSON array the frontend already consumes.
+"""
+import base64
+import binascii
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+
+from facets import ATTRS_FIELD
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# What a listing card in the grid renders
+CARD_FIELDS = (
+    "id", "title", "category", "price_per_day", "location", "images", "image_variants", "available", "created_at",
+)
+
+SortSpec = Sequence[Tuple[str, int]]
+
+# What a cursor value must be for each sort key; computed keys (leading
+# underscore: text score, distance) are numbers
+_CURSOR_TYPES: Dict[str, type] = {"created_at": datetime, "id": str}
+
+
+@dataclass
+class Page:
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def encode_cursor(values: Iterable[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort: SortSpec) -> Optional[List[Any]]:
+    """Decode a cursor produced by :func:`encode_cursor` for the given sort."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise ValueError("cursor does not match the sort order")
+        decoded = [_decode_value(v) for v in values]
+        # The values go into query predicates; anything but the expected
+        # scalar (an operator object, say) would change their meaning
+        for (key, _), value in zip(sort, decoded):
+            if not _valid_cursor_value(key, value):
+                raise ValueError(f"bad cursor value for {key}")
+        return decoded
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _valid_cursor_value(key: str, value: Any) -> bool:
+    if key.startswith("_"):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    expected = _CURSOR_TYPES.get(key)
+    if expected is not None:
+        return isinstance(value, expected)
+    return isinstance(value, (str, int, float, datetime)) and not isinstance(value, bool)
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any]) -> Dict[str, Any]:
+    """Match documents strictly after ``values`` in ``sort`` order.
+
+    For ``[(a, -1), (b, -1)]`` this is ``a < va OR (a == va AND b < vb)``.
+    """
+    branches = []
+    for i, (key, direction) in enumerate(sort):
+        branch = {prev_key: values[j] for j, (prev_key, _) in enumerate(sort[:i])}
+        branch[key] = {"$lt" if direction < 0 else "$gt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def after_cursor(query: Dict[str, Any], sort: SortSpec, values: Optional[Sequence[Any]]) -> Dict[str, Any]:
+    if values is None:
+        return query
+    return {"$and": [query, keyset_filter(sort, values)]}
+
+
+def select_fields(fields: Optional[str], view: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Resolve the ``fields=`` / ``view=`` query params into a field list.
+
+    ``None`` means the full document.
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(selected) - set(allowed))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return selected
+    if view == "card":
+        return list(CARD_FIELDS)
+    return None
+
+
+def projection_for(fields: Optional[List[str]], sort: SortSpec) -> Dict[str, Any]:
+    """Mongo projection for ``fields`` that always carries the sort keys."""
+    if fields is None:
+        # The spec attributes only exist for the index (see facets.py)
+        return {"_id": 0, ATTRS_FIELD: 0}
+    projection: Dict[str, Any] = {"_id": 0}
+    for name in list(fields) + [key for key, _ in sort]:
+        projection[name] = 1
+    return projection
+
+
+def make_page(docs: List[Dict[str, Any]], limit: int, sort: SortSpec, fields: Optional[List[str]]) -> Page:
+    """Trim a ``limit + 1`` fetch to a page and derive the next cursor."""
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1].get(key) for key, _ in sort)
+    # Sort keys were only fetched to build the cursor; private ones
+    # (leading underscore) and ones the caller did not ask for are dropped
+    hidden = [key for key, _ in sort if key.startswith("_") or (fields is not None and key not in fields)]
+    if hidden:
+        for doc in docs:
+            for key in hidden:
+                doc.pop(key, None)
+    return Page(items=docs, next_cursor=next_cursor)
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
@@ -0,0 +1,242 @@
+"""Per-client rate limits and global admission control.
+
+Expensive routes (search, inquiry writes, imports) take a token from a
+bucket keyed on route and client IP before they run; an empty bucket
+answers 429 with ``Retry-After``. Buckets live in a :class:`RateLimitBackend`:
+:class:`MemoryBackend` (default, per process) or :class:`MongoBackend`
+(``RATE_LIMIT_BACKEND=mongo``, shared by every worker and host). Anything
+with the same ``take`` coroutine can be plugged in.
+
+:class:`AdmissionMiddleware` caps requests in flight at the Mongo pool size,
+queues a bounded number more for a short while and sheds the rest with 503
+and ``Retry-After``, so overload turns into fast rejections instead of
+requests stuck waiting for a connection.
+
+Client IPs come from the connection; behind a proxy, run the server with
+proxy headers enabled (``FORWARDED_ALLOW_IPS``) so they are the real ones.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Pattern, Protocol, Tuple
+
+from fastapi import Depends, HTTPException, Request
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+import metrics
+from serialization import dumps
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens added per second
+    burst: int  # bucket size
+
+    @classmethod
+    def from_env(cls, name: str, default: "Limit") -> "Limit":
+        """``RATE_LIMIT_<NAME>=<rate>/<burst>``, e.g. ``RATE_LIMIT_SEARCH=5/20``."""
+        value = os.environ.get(f"RATE_LIMIT_{name.upper()}")
+        if not value:
+            return default
+        rate, _, burst = value.partition("/")
+        return cls(float(rate), int(burst or default.burst))
+
+
+LIMITS: Dict[str, Limit] = {
+    name: Limit.from_env(name, default)
+    for name, default in {
+        "search": Limit(5, 20),
+        "inquiries": Limit(1, 10),
+        "bulk_inquiries": Limit(0.2, 2),
+        "holds": Limit(1, 10),
+        "import": Limit(0.1, 2),
+    }.items()
+}
+
+RATE_LIMIT_INDEXES = [
+    # Idle buckets are full again, so dropping them loses nothing
+    IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+]
+
+
+class RateLimitBackend(Protocol):
+    async def take(self, key: str, limit: Limit, now: float) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+
+
+class MemoryBackend:
+    """Token buckets in a bounded LRU dict.
+
+    A bucket idle for ``burst / rate`` seconds has refilled completely, so it
+    is dropped; the least recently used ones go first when ``max_keys`` is
+    reached. Each bucket is a tuple of three floats.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, idle_after)
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, limit: Limit, now: float) -> float:
+        self._expire(now)
+        tokens, updated_at, _ = self._buckets.pop(key, (limit.burst, now, 0.0))
+        tokens = min(limit.burst, tokens + (now - updated_at) * limit.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def _expire(self, now: float) -> None:
+        # Oldest first; stops at the first bucket that is still refilling
+        while self._buckets:
+            key, (_, _, idle_after) = next(iter(self._buckets.items()))
+            if idle_after > now:
+                break
+            del self._buckets[key]
+
+
+class MongoBackend:
+    """Token buckets in the ``rate_limits`` collection, shared by all workers.
+
+    Each take is one atomic ``findOneAndUpdate`` with an update pipeline that
+    refills and spends in place. ``now`` must come from a clock shared by the
+    hosts (``time.time``).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, limit: Limit, now: float) -> float:
+        refilled = {"$min": [limit.burst, {"$add": [
+            {"$ifNull": ["$tokens", limit.burst]},
+            {"$multiply": [limit.rate, {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}]},
+        ]}]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": datetime.utcfromtimestamp(now) + timedelta(seconds=limit.burst / limit.rate),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return 0.0 if bucket["allowed"] else (1 - bucket["tokens"]) / limit.rate
+
+
+class RateLimiter:
+    def __init__(self, backend: Optional[RateLimitBackend] = None, enabled: bool = True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+
+    def dependency(self, name: str):
+        """Route dependency enforcing ``LIMITS[name]`` per client IP."""
+        limit = LIMITS[name]
+
+        async def check(request: Request) -> None:
+            if not self.enabled:
+                return
+            client = request.client.host if request.client else "unknown"
+            wait = await self.backend.take(f"{name}:{client}", limit, time.time())
+            if wait:
+                metrics.rate_limited.inc(limit=name)
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+
+        return Depends(check)
+
+
+def rate_limiting_enabled() -> bool:
+    return os.environ.get("RATE_LIMITING", "on").lower() not in ("0", "off", "false")
+
+
+rate_limiter = RateLimiter(
+    MemoryBackend(max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100_000))),
+    enabled=rate_limiting_enabled(),
+)
+
+
+# Long-lived or database-free requests that shouldn't hold a slot; exports
+# stream for as long as the download takes and hold one connection each
+ADMISSION_EXEMPT = re.compile(r"^/api/(health|metrics|suggest|listings/stream|images/.*|export/.*)$")
+
+
+class AdmissionMiddleware:
+    """ASGI middleware bounding the requests in flight.
+
+    Up to ``max_concurrent`` requests run; up to ``max_queue`` more wait at
+    most ``queue_timeout`` seconds for a slot. Everything beyond is answered
+    503 straight away.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float = 1.0,
+        exempt: Pattern = ADMISSION_EXEMPT,
+    ):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt = exempt
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.exempt.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked():
+            if self._waiting >= self.max_queue:
+                await self._reject(send, "queue_full")
+                return
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._reject(send, "queue_timeout")
+                return
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _reject(self, send, reason: str) -> None:
+        metrics.requests_shed.inc(reason=reason)
+        body = dumps({"detail": "Server is busy, please retry shortly"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
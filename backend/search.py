@@ -0,0 +1,35 @@
+"""Full-text listing search backed by a MongoDB text index.
+
+The text index tokenizes and stems ``title``, ``location`` and
+``description`` (English rules) when a listing is written, so the index is
+always current and a query only touches the postings for its terms instead
+of scanning the collection. Matches are ranked by Mongo's ``textScore``,
+which weighs a hit in the title above one in the location or description.
+"""
+from typing import Any, Dict, Optional
+
+from pymongo import TEXT, IndexModel
+
+TEXT_INDEX_NAME = "listing_text_search"
+TEXT_INDEX_WEIGHTS = {"title": 10, "location": 5, "description": 1}
+TEXT_SCORE = {"$meta": "textScore"}
+SCORE_FIELD = "_score"
+
+TEXT_INDEX = IndexModel(
+    [(field, TEXT) for field in TEXT_INDEX_WEIGHTS],
+    name=TEXT_INDEX_NAME,
+    weights=TEXT_INDEX_WEIGHTS,
+    default_language="english",
+)
+
+# Best match first; newer listings win ties, as in the unranked listing view.
+# ``id`` breaks the remaining ties so the order is total for keyset paging.
+SEARCH_SORT = [(SCORE_FIELD, -1), ("created_at", -1), ("id", -1)]
+
+
+def build_search_query(q: str, category: Optional[str] = None) -> Dict[str, Any]:
+    """Build the filter for a keyword search over available listings."""
+    query: Dict[str, Any] = {"available": True, "$text": {"$search": q}}
+    if category:
+        query["category"] = category.lower()
+    return query
@@ -0,0 +1,159 @@
+"""Sample and synthetic listing data.
+
+``sample_listings`` is what a fresh install is seeded with.
+``synthetic_listings`` varies those samples into any number of realistic
+listings for load tests and benchmarks.
+"""
+from datetime import datetime, timedelta
+import random
+from typing import Any, Dict, Iterator, List
+import uuid
+
+from geocoding import CITY_COORDINATES, geocode_point
+
+# Sample ids are derived from the title, so every install (and every
+# worker that might race to seed) agrees on them
+SAMPLE_NAMESPACE = uuid.UUID("6f1c7a52-3b8e-4d1e-9a0c-5d2f4b7e8c31")
+
+
+def sample_listings() -> List[Dict[str, Any]]:
+    listings = [
+        {
+            "title": "Luxury Ferrari 488 Spider",
+            "description": "Experience the thrill of driving a luxury Ferrari 488 Spider. Perfect for special occasions and weekend getaways.",
+            "category": "cars",
+            "price_per_day": 899.00,
+            "location": "Los Angeles, CA",
+            "images": ["https://images.pexels.com/photos/1545743/pexels-photo-1545743.jpeg"],
+            "specifications": {
+                "year": 2022,
+                "seats": 2,
+                "transmission": "Automatic",
+                "fuel_type": "Gasoline"
+            },
+            "available": True,
+            "owner_name": "Elite Car Rentals",
+            "owner_contact": "contact@eliterentals.com",
+            "created_at": datetime.utcnow()
+        },
+        {
+            "title": "Luxury Yacht Charter - 60ft",
+            "description": "Stunning 60ft luxury yacht perfect for parties, events, and ocean adventures. Includes crew and amenities.",
+            "category": "yachts",
+            "price_per_day": 2499.00,
+            "location": "Miami, FL",
+            "images": ["https://images.pexels.com/photos/32619596/pexels-photo-32619596.jpeg"],
+            "specifications": {
+                "length": "60 feet",
+                "guests": 12,
+                "crew_included": True,
+                "amenities": ["Kitchen", "Bedrooms", "Entertainment System"]
+            },
+            "available": True,
+            "owner_name": "Ocean Dreams Charters",
+            "owner_contact": "info@oceandreams.com",
+            "created_at": datetime.utcnow()
+        },
+        {
+            "title": "Beachfront Villa Rental",
+            "description": "Stunning beachfront villa with panoramic ocean views. Perfect for vacation rentals and special events.",
+            "category": "houses",
+            "price_per_day": 799.00,
+            "location": "Malibu, CA",
+            "images": ["https://images.pexels.com/photos/59924/pexels-photo-59924.jpeg"],
+            "specifications": {
+                "bedrooms": 4,
+                "bathrooms": 3,
+                "sleeps": 8,
+                "amenities": ["Pool", "Beach Access", "Kitchen", "WiFi"]
+            },
+            "available": True,
+            "owner_name": "Coastal Properties",
+            "owner_contact": "rentals@coastalprops.com",
+            "created_at": datetime.utcnow()
+        },
+        {
+            "title": "Harley Davidson Street Glide",
+            "description": "Cruise in style with this iconic Harley Davidson Street Glide. Perfect for road trips and adventures.",
+            "category": "bikes",
+            "price_per_day": 199.00,
+            "location": "Austin, TX",
+            "images": ["https://images.unsplash.com/photo-1558618666-fcd25c85cd64"],
+            "specifications": {
+                "year": 2023,
+                "engine": "Milwaukee-Eight 114",
+                "type": "Touring"
+            },
+            "available": True,
+            "owner_name": "Lone Star Bike Rentals",
+            "owner_contact": "info@lonestarbikerentals.com",
+            "created_at": datetime.utcnow()
+        },
+        {
+            "title": "Private Jet Charter - Cessna Citation",
+            "description": "Luxury private jet charter for business or leisure travel. Includes pilot and premium service.",
+            "category": "planes",
+            "price_per_day": 4999.00,
+            "location": "New York, NY",
+            "images": ["https://images.unsplash.com/photo-1544636235-1-photo-1545670723-673ed2f20e04"],
+            "specifications": {
+                "model": "Cessna Citation CJ3+",
+                "passengers": 7,
+                "range": "2,040 miles",
+                "pilot_included": True
+            },
+            "available": True,
+            "owner_name": "Elite Aviation",
+            "owner_contact": "charter@eliteaviation.com",
+            "created_at": datetime.utcnow()
+        },
+        {
+            "title": "Speed Boat - 32ft Sport Cruiser",
+            "description": "High-performance sport boat perfect for water sports, fishing, and coastal cruising.",
+            "category": "boats",
+            "price_per_day": 599.00,
+            "location": "San Diego, CA",
+            "images": ["https://images.unsplash.com/photo-1560216874-c209251cba8e"],
+            "specifications": {
+                "length": "32 feet",
+                "passengers": 8,
+                "engine": "Twin 350HP",
+                "features": ["GPS", "Sound System", "Safety Equipment"]
+            },
+            "available": True,
+            "owner_name": "Pacific Boat Rentals",
+            "owner_contact": "rentals@pacificboats.com",
+            "created_at": datetime.utcnow()
+        }
+    ]
+    for listing in listings:
+        listing["id"] = str(uuid.uuid5(SAMPLE_NAMESPACE, listing["title"]))
+        listing["geo"] = geocode_point(listing["location"])
+    return listings
+
+
+def synthetic_listings(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` listings derived from the samples.
+
+    Titles, prices, cities, availability and creation times are varied
+    deterministically from ``seed`` so runs are comparable.
+    """
+    rng = random.Random(seed)
+    templates = sample_listings()
+    cities = sorted(CITY_COORDINATES)
+    now = datetime.utcnow()
+    for i in range(count):
+        template = templates[i % len(templates)]
+        city = rng.choice(cities)
+        name, state = city.rsplit(", ", 1)
+        location = f"{name.title()}, {state.upper()}"
+        yield {
+            **template,
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "title": f"{template['title']} #{i}",
+            "price_per_day": round(template["price_per_day"] * rng.uniform(0.5, 1.5), 2),
+            "location": location,
+            "geo": geocode_point(location),
+            "available": rng.random() < 0.9,
+            "created_at": now - timedelta(seconds=i, milliseconds=rng.randrange(1000)),
+        }
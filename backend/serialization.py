@@ -0,0 +1,32 @@
+"""Fast JSON responses for the read endpoints.
+
+Routes hand already-shaped Mongo documents straight to
+:class:`FastJSONResponse`, skipping FastAPI's per-item ``response_model``
+validation and ``jsonable_encoder`` walk. The bytes match what the default
+``JSONResponse`` produced: compact separators, UTF-8 rather than ``\\u``
+escapes, and datetimes as ``datetime.isoformat()`` (naive values stay naive,
+microseconds only when non-zero).
+"""
+from datetime import date, datetime
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any) -> Any:
+    # orjson covers datetime/date natively; this only sees types it lacks
+    # (e.g. Decimal, ObjectId), which get FastAPI's usual treatment
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
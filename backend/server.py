@@ -1,22 +1,103 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta
+import asyncio
+import logging
 import os
-from pymongo import MongoClient
-from datetime import datetime
-import uuid
+import socket
+import time
 
-# Database Setup
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = MongoClient(MONGO_URL)
-db = client.rental_marketplace
+from analytics import DEFAULT_DAYS, MAX_DAYS, InquiryAnalytics, analytics_enabled
+from auth import require_admin
+from bookings import BookingConflict, blocked_dates, confirm_booking, create_hold, free_between
+from cache import AVAILABILITY_TAG, LISTINGS_TAG, cache_key, invalidation_listener, listing_tag, response_cache
+from categories import counter_listener, list_categories, rebuild_category_counts
+from conditional import LISTINGS_VERSION, ETagMiddleware, version_listener
+from database import LISTING_PROJECTION, LISTING_SORT, NEARBY_SORT, NO_ID, database
+from export import (
+    DEFAULT_BATCH_SIZE,
+    INQUIRY_COLUMNS,
+    LISTING_COLUMNS,
+    MAX_BATCH_SIZE,
+    MEDIA_TYPES,
+    export_cursor,
+    stream_export,
+)
+from facets import backfill_spec_attrs, facet_pipeline, format_facets, parse_spec_filters, price_range
+from geocoding import backfill_coordinates, geo_point
+from images import IMAGE_CACHE_CONTROL, MEDIA_TYPES as IMAGE_MEDIA_TYPES, ImagePipeline, image_path, pipeline_enabled
+from importer import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, import_listings, lines_from_chunks
+from indexes import ensure_indexes
+import metrics
+from live import ListingHub
+from inquiries import MAX_BULK_INQUIRIES, BufferClosed, InquiryBuffer, buffering_enabled, ingest_inquiries
+from models import Category, Inquiry, Listing
+from ratelimit import AdmissionMiddleware, MongoBackend, rate_limiter
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    select_fields,
+    set_next_cursor,
+)
+from search import SEARCH_SORT, build_search_query
+from snapshot import ListingSnapshot, snapshot_enabled
+from suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, SuggestIndex
+from seed import sample_listings
+from serialization import FastJSONResponse
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional; gzip only
+    BrotliMiddleware = None
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="Rental Marketplace API",
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+)
+
+async def listings_version():
+    # Re-read at most once a second per worker; local writes invalidate it
+    version = await response_cache.get_or_load(
+        cache_key("version", name=LISTINGS_VERSION),
+        lambda: database.versions.get(LISTINGS_VERSION),
+        ttl=1,
+        tags=[LISTINGS_TAG],
+    )
+    # Before an ETag names this version, drop bodies from an older one
+    # written by another worker
+    response_cache.observe_version(version)
+    return version
+
+# Conditional GETs sit closest to the routes so a 304 skips all the work
+app.add_middleware(ETagMiddleware, version=listings_version)
+
+# Shed load before requests queue up for Mongo connections
+app.add_middleware(
+    AdmissionMiddleware,
+    max_concurrent=int(os.environ.get("ADMISSION_MAX_CONCURRENT", database.settings.max_pool_size)),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", 2 * database.settings.max_pool_size)),
+    queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", 1)),
+)
 
-# Collections
-listings = db.listings
-inquiries = db.inquiries
+# Compress bodies over 1KB, with brotli when the client and install allow it;
+# image variants are already compressed
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware, minimum_size=1024, excluded_handlers=[r"^/api/images/", r"^/api/listings/stream$"]
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
 
-app = FastAPI(title="Rental Marketplace API", version="1.0.0")
+# Outside compression so response sizes are what went over the wire
+app.add_middleware(metrics.MetricsMiddleware, router=app.router)
 
 # CORS setup
 app.add_middleware(
@@ -25,248 +106,544 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Models
-class Listing(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    title: str
-    description: str
-    category: str  # cars, bikes, houses, boats, planes, yachts
-    price_per_day: float
-    location: str
-    images: List[str] = []
-    specifications: Dict[str, Any] = {}
-    available: bool = True
-    owner_name: str
-    owner_contact: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class Inquiry(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    listing_id: str
-    name: str
-    email: str
-    phone: str
-    start_date: str
-    end_date: str
-    message: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+# One-time startup work runs in a single process at a time; the lease
+# outlives a normal bootstrap and frees the lock if its holder dies
+STARTUP_LOCK = "startup"
+STARTUP_LOCK_TTL = timedelta(minutes=int(os.environ.get("STARTUP_LOCK_MINUTES", 10)))
 
 # Sample data initialization
-def init_sample_data():
-    if listings.count_documents({}) == 0:
-        sample_listings = [
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Luxury Ferrari 488 Spider",
-                "description": "Experience the thrill of driving a luxury Ferrari 488 Spider. Perfect for special occasions and weekend getaways.",
-                "category": "cars",
-                "price_per_day": 899.00,
-                "location": "Los Angeles, CA",
-                "images": ["https://images.pexels.com/photos/1545743/pexels-photo-1545743.jpeg"],
-                "specifications": {
-                    "year": 2022,
-                    "seats": 2,
-                    "transmission": "Automatic",
-                    "fuel_type": "Gasoline"
-                },
-                "available": True,
-                "owner_name": "Elite Car Rentals",
-                "owner_contact": "contact@eliterentals.com",
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Luxury Yacht Charter - 60ft",
-                "description": "Stunning 60ft luxury yacht perfect for parties, events, and ocean adventures. Includes crew and amenities.",
-                "category": "yachts",
-                "price_per_day": 2499.00,
-                "location": "Miami, FL",
-                "images": ["https://images.pexels.com/photos/32619596/pexels-photo-32619596.jpeg"],
-                "specifications": {
-                    "length": "60 feet",
-                    "guests": 12,
-                    "crew_included": True,
-                    "amenities": ["Kitchen", "Bedrooms", "Entertainment System"]
-                },
-                "available": True,
-                "owner_name": "Ocean Dreams Charters",
-                "owner_contact": "info@oceandreams.com",
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Beachfront Villa Rental",
-                "description": "Stunning beachfront villa with panoramic ocean views. Perfect for vacation rentals and special events.",
-                "category": "houses",
-                "price_per_day": 799.00,
-                "location": "Malibu, CA",
-                "images": ["https://images.pexels.com/photos/59924/pexels-photo-59924.jpeg"],
-                "specifications": {
-                    "bedrooms": 4,
-                    "bathrooms": 3,
-                    "sleeps": 8,
-                    "amenities": ["Pool", "Beach Access", "Kitchen", "WiFi"]
-                },
-                "available": True,
-                "owner_name": "Coastal Properties",
-                "owner_contact": "rentals@coastalprops.com",
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Harley Davidson Street Glide",
-                "description": "Cruise in style with this iconic Harley Davidson Street Glide. Perfect for road trips and adventures.",
-                "category": "bikes",
-                "price_per_day": 199.00,
-                "location": "Austin, TX",
-                "images": ["https://images.unsplash.com/photo-1558618666-fcd25c85cd64"],
-                "specifications": {
-                    "year": 2023,
-                    "engine": "Milwaukee-Eight 114",
-                    "type": "Touring"
-                },
-                "available": True,
-                "owner_name": "Lone Star Bike Rentals",
-                "owner_contact": "info@lonestarbikerentals.com",
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Private Jet Charter - Cessna Citation",
-                "description": "Luxury private jet charter for business or leisure travel. Includes pilot and premium service.",
-                "category": "planes",
-                "price_per_day": 4999.00,
-                "location": "New York, NY",
-                "images": ["https://images.unsplash.com/photo-1544636235-1-photo-1545670723-673ed2f20e04"],
-                "specifications": {
-                    "model": "Cessna Citation CJ3+",
-                    "passengers": 7,
-                    "range": "2,040 miles",
-                    "pilot_included": True
-                },
-                "available": True,
-                "owner_name": "Elite Aviation",
-                "owner_contact": "charter@eliteaviation.com",
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": str(uuid.uuid4()),
-                "title": "Speed Boat - 32ft Sport Cruiser",
-                "description": "High-performance sport boat perfect for water sports, fishing, and coastal cruising.",
-                "category": "boats",
-                "price_per_day": 599.00,
-                "location": "San Diego, CA",
-                "images": ["https://images.unsplash.com/photo-1560216874-c209251cba8e"],
-                "specifications": {
-                    "length": "32 feet",
-                    "passengers": 8,
-                    "engine": "Twin 350HP",
-                    "features": ["GPS", "Sound System", "Safety Equipment"]
-                },
-                "available": True,
-                "owner_name": "Pacific Boat Rentals",
-                "owner_contact": "rentals@pacificboats.com",
-                "created_at": datetime.utcnow()
-            }
-        ]
-        
-        for listing in sample_listings:
-            listings.insert_one(listing)
+async def init_sample_data():
+    if await database.listings.count() == 0:
+        await database.listings.insert_many(sample_listings())
+
+async def bootstrap() -> bool:
+    """Indexes, seed data, backfills and counters; safe to run again.
+
+    Returns whether this process ran them.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not await database.locks.acquire(STARTUP_LOCK, owner, STARTUP_LOCK_TTL):
+        logger.info("Startup tasks are running in another worker; skipping them here")
+        return False
+    try:
+        await ensure_indexes(database.db)
+        await init_sample_data()
+        await backfill_coordinates(database)
+        await backfill_spec_attrs(database)
+        await rebuild_category_counts(database)
+    finally:
+        await database.locks.release(STARTUP_LOCK, owner)
+    return True
 
 # API Routes
 @app.on_event("startup")
 async def startup_event():
-    init_sample_data()
+    database.connect(event_listeners=[metrics.command_metrics, metrics.pool_metrics])
+    if os.environ.get("RATE_LIMIT_BACKEND") == "mongo":
+        rate_limiter.backend = MongoBackend(database.db.rate_limits)
+    database.listings.add_listener(counter_listener(database))
+    # Bump the version before dropping cache entries so a reload can't
+    # re-cache the old version
+    database.listings.add_listener(version_listener(database))
+    if snapshot_enabled():
+        # Patched before the cached version is dropped, so a request never
+        # pairs the new version with the old snapshot
+        app.state.listing_snapshot = ListingSnapshot(database, version=listings_version)
+        database.listings.add_listener(app.state.listing_snapshot.listener())
+    app.state.suggest_index = SuggestIndex(database, version=listings_version)
+    database.listings.add_listener(app.state.suggest_index.listener())
+    database.listings.add_listener(invalidation_listener(response_cache))
+    bootstrapped = await bootstrap()
+    if snapshot_enabled():
+        await app.state.listing_snapshot.load()
+    await app.state.suggest_index.build()
+    app.state.listing_hub = ListingHub(database)
+    database.listings.add_listener(app.state.listing_hub.listener())
+    app.state.listing_hub.start()
+    if pipeline_enabled():
+        app.state.image_pipeline = ImagePipeline(database)
+        app.state.image_pipeline.start()
+        database.listings.add_listener(app.state.image_pipeline.listener())
+        if bootstrapped:
+            await app.state.image_pipeline.enqueue_missing()
+    if buffering_enabled():
+        app.state.inquiry_buffer = InquiryBuffer(database.inquiries)
+        app.state.inquiry_buffer.start()
+    if analytics_enabled():
+        app.state.analytics = InquiryAnalytics(database)
+        app.state.analytics.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    inquiry_buffer = getattr(app.state, "inquiry_buffer", None)
+    if inquiry_buffer is not None:
+        await inquiry_buffer.close()
+    listing_hub = getattr(app.state, "listing_hub", None)
+    if listing_hub is not None:
+        await listing_hub.close()
+    listing_snapshot = getattr(app.state, "listing_snapshot", None)
+    if listing_snapshot is not None:
+        await listing_snapshot.close()
+    suggest_index = getattr(app.state, "suggest_index", None)
+    if suggest_index is not None:
+        await suggest_index.close()
+    image_pipeline = getattr(app.state, "image_pipeline", None)
+    if image_pipeline is not None:
+        await image_pipeline.close()
+    analytics = getattr(app.state, "analytics", None)
+    if analytics is not None:
+        await analytics.close()
+    database.close()
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "message": "Rental Marketplace API is running"}
+    """Liveness plus database round-trip time and connection pool usage"""
+    max_pool_size = database.settings.max_pool_size
+    in_use = metrics.pool_metrics.in_use()
+    pool = {
+        "in_use": in_use,
+        "max_size": max_pool_size,
+        "saturation": round(in_use / max_pool_size, 3) if max_pool_size else None,
+    }
+    start = time.perf_counter()
+    try:
+        await database.db.command("ping")
+    except Exception as exc:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "unhealthy",
+                "message": "Database is unreachable",
+                "database": {"error": str(exc)},
+                "pool": pool,
+            },
+        )
+    return {
+        "status": "healthy",
+        "message": "Rental Marketplace API is running",
+        "database": {"ping_ms": round((time.perf_counter() - start) * 1000, 2)},
+        "pool": pool,
+    }
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-@app.get("/api/listings", response_model=List[Dict])
-async def get_listings(category: Optional[str] = None, location: Optional[str] = None):
-    """Get all listings with optional filtering"""
+# The read routes return FastJSONResponse themselves so their documents skip
+# response_model validation; the models only describe the schema.
+@app.get("/api/listings", response_model=List[Listing])
+async def get_listings(
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[Literal["card"]] = None,
+    available_from: Optional[date] = None,
+    available_to: Optional[date] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    spec: Optional[List[str]] = Query(None),
+):
+    """Get a page of listings with optional filtering, newest first.
+
+    available_from/available_to keep only listings free for every night
+    from available_from up to (not including) available_to. Each spec
+    filter is key:value or a numeric key:min..max range, e.g. seats:4..
+    """
     query = {"available": True}
     
     if category:
         query["category"] = category.lower()
     if location:
         query["location"] = {"$regex": location, "$options": "i"}
+    price = price_range(min_price, max_price)
+    if price:
+        query["price_per_day"] = price
+    spec_filters = parse_spec_filters(spec)
+    if spec_filters:
+        query["$and"] = spec_filters
+    if (available_from is None) != (available_to is None):
+        raise HTTPException(status_code=400, detail="available_from and available_to go together")
+    if available_from and available_to <= available_from:
+        raise HTTPException(status_code=400, detail="available_to must be after available_from")
+    
+    after = decode_cursor(cursor, LISTING_SORT)
+    selected = select_fields(fields, view, Listing.model_fields)
+    
+    # The homepage grid: served from pre-rendered pages when they're current
+    listing_snapshot = getattr(app.state, "listing_snapshot", None)
+    if (
+        listing_snapshot is not None
+        and limit == DEFAULT_PAGE_SIZE
+        and not (location or selected or available_from or price or spec_filters)
+    ):
+        rendered = await listing_snapshot.page(query.get("category"), cursor)
+        if rendered is not None:
+            body, next_cursor = rendered
+            response = Response(body, media_type="application/json")
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+            return response
+    
+    async def load_page():
+        stages = free_between(database, available_from, available_to) if available_from else None
+        return await database.listings.find_page(query, limit, after=after, fields=selected, stages=stages)
+    
+    page = await response_cache.get_or_load(
+        cache_key("listings", category=query.get("category"), location=location, limit=limit,
+                  cursor=cursor, fields=selected, available_from=available_from, available_to=available_to,
+                  min_price=min_price, max_price=max_price, spec=sorted(spec) if spec else None),
+        load_page,
+        ttl=10 if available_from else None,
+        tags=[LISTINGS_TAG, AVAILABILITY_TAG] if available_from else [LISTINGS_TAG],
+    )
+    response = FastJSONResponse(page.items)
+    set_next_cursor(response, page)
+    return response
+
+@app.get("/api/listings/stream")
+async def stream_listings(request: Request):
+    """Server-sent events for listing inserts and updates, as deltas"""
+    return StreamingResponse(
+        app.state.listing_hub.stream(request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        # identity keeps gzip from buffering events; no-transform/X-Accel
+        # keep proxies from doing the same
+        headers={
+            "Cache-Control": "no-cache, no-transform",
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+@app.get("/api/listings/facets")
+async def get_listing_facets(
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    spec: Optional[List[str]] = Query(None),
+):
+    """Category, price band and specification counts under the given filters"""
+    query = {"available": True}
+    if location:
+        query["location"] = {"$regex": location, "$options": "i"}
+    spec_filters = parse_spec_filters(spec)
+    if spec_filters:
+        query["$and"] = spec_filters
+    category = category.lower() if category else None
+    price = price_range(min_price, max_price)
+    
+    async def load_facets():
+        results = await database.listings.aggregate(facet_pipeline(query, category, price))
+        return format_facets(results[0])
+    
+    facets = await response_cache.get_or_load(
+        cache_key("facets", category=category, location=location, min_price=min_price,
+                  max_price=max_price, spec=sorted(spec) if spec else None),
+        load_facets,
+        tags=[LISTINGS_TAG],
+    )
+    return FastJSONResponse(facets)
+
+@app.get("/api/listings/nearby", response_model=List[Listing])
+async def get_nearby_listings(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(50, gt=0, le=1000),
+    category: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[Literal["card"]] = None,
+):
+    """Get available listings within radius_km of a point, closest first"""
+    query = {"available": True}
+    if category:
+        query["category"] = category.lower()
     
-    results = list(listings.find(query, {"_id": 0}).sort("created_at", -1))
-    return results
+    page = await database.listings.nearby_page(
+        geo_point(lat, lng),
+        radius_km * 1000,
+        query,
+        limit,
+        after=decode_cursor(cursor, NEARBY_SORT),
+        fields=select_fields(fields, view, Listing.model_fields),
+    )
+    response = FastJSONResponse(page.items)
+    set_next_cursor(response, page)
+    return response
 
-@app.get("/api/listings/{listing_id}")
+@app.get("/api/listings/{listing_id}", response_model=Listing)
 async def get_listing(listing_id: str):
     """Get a specific listing by ID"""
-    listing = listings.find_one({"id": listing_id}, {"_id": 0})
+    listing = await response_cache.get_or_load(
+        cache_key("listing", id=listing_id),
+        lambda: database.listings.get(listing_id),
+        ttl=60,
+        tags=[listing_tag(listing_id)],
+    )
     if not listing:
         raise HTTPException(status_code=404, detail="Listing not found")
-    return listing
+    return FastJSONResponse(listing)
 
-@app.get("/api/categories")
-async def get_categories():
-    """Get all available categories with counts"""
-    pipeline = [
-        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    
-    results = list(listings.aggregate(pipeline))
-    categories = []
+@app.get("/api/listings/{listing_id}/availability")
+async def get_listing_availability(
+    listing_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """Get the held or booked nights of a listing (default: the next 90 days)"""
+    start_date = start_date or datetime.utcnow().date()
+    end_date = end_date or start_date + timedelta(days=90)
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if not await database.listings.exists(listing_id):
+        raise HTTPException(status_code=404, detail="Listing not found")
     
-    category_info = {
-        "cars": {"name": "Cars", "icon": "🚗"},
-        "bikes": {"name": "Bikes", "icon": "🏍️"}, 
-        "houses": {"name": "Houses", "icon": "🏡"},
-        "boats": {"name": "Boats", "icon": "⛵"},
-        "planes": {"name": "Planes", "icon": "✈️"},
-        "yachts": {"name": "Yachts", "icon": "🛥️"}
+    return {
+        "listing_id": listing_id,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "blocked_dates": await blocked_dates(database, listing_id, start_date, end_date),
     }
-    
-    for result in results:
-        category = result["_id"]
-        if category in category_info:
-            categories.append({
-                "id": category,
-                "name": category_info[category]["name"],
-                "icon": category_info[category]["icon"],
-                "count": result["count"]
-            })
-    
-    return categories
 
-@app.post("/api/inquiries")
+@app.get("/api/categories", response_model=List[Category])
+async def get_categories():
+    """Get all available categories with counts"""
+    categories = await response_cache.get_or_load(
+        cache_key("categories"),
+        lambda: list_categories(database),
+        ttl=60,
+        tags=[LISTINGS_TAG],
+    )
+    return FastJSONResponse(categories)
+
+@app.post("/api/listings/import", dependencies=[require_admin, rate_limiter.dependency("import")])
+async def import_listings_endpoint(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE),
+    skip: int = Query(0, ge=0),
+):
+    """Upsert listings from an NDJSON or CSV body, keyed on id (admin only)"""
+    report = await import_listings(
+        database, lines_from_chunks(request.stream()), format, chunk_size=chunk_size, skip=skip
+    )
+    return report.to_dict()
+
+@app.post("/api/inquiries", dependencies=[rate_limiter.dependency("inquiries")])
 async def create_inquiry(inquiry: Inquiry):
     """Create a new rental inquiry"""
     # Verify listing exists
-    listing = listings.find_one({"id": inquiry.listing_id}, {"_id": 0})
-    if not listing:
+    if not await database.listings.exists(inquiry.listing_id):
         raise HTTPException(status_code=404, detail="Listing not found")
     
     inquiry_dict = inquiry.dict()
-    inquiries.insert_one(inquiry_dict)
+    inquiry_buffer = getattr(app.state, "inquiry_buffer", None)
+    if inquiry_buffer is not None:
+        try:
+            inquiry_buffer.submit(inquiry_dict)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503, detail="Too many pending inquiries, please retry", headers={"Retry-After": "1"}
+            )
+        except BufferClosed:
+            raise HTTPException(
+                status_code=503, detail="Server is shutting down, please retry", headers={"Retry-After": "5"}
+            )
+    else:
+        await database.inquiries.insert_one(inquiry_dict)
     
     return {"message": "Inquiry submitted successfully", "inquiry_id": inquiry.id}
 
-@app.get("/api/search")
-async def search_listings(q: str, category: Optional[str] = None):
-    """Search listings by keyword"""
-    query = {
-        "available": True,
-        "$or": [
-            {"title": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"location": {"$regex": q, "$options": "i"}}
-        ]
-    }
+@app.post("/api/inquiries/bulk", dependencies=[rate_limiter.dependency("bulk_inquiries")])
+async def create_inquiries_bulk(inquiries: List[Inquiry]):
+    """Create a batch of rental inquiries in one write"""
+    if not inquiries:
+        raise HTTPException(status_code=400, detail="No inquiries submitted")
+    if len(inquiries) > MAX_BULK_INQUIRIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_INQUIRIES} inquiries per request")
+    return await ingest_inquiries(database, inquiries)
+
+@app.post("/api/inquiries/{inquiry_id}/hold", dependencies=[require_admin, rate_limiter.dependency("holds")])
+async def hold_inquiry_dates(inquiry_id: str):
+    """Hold an inquiry's dates on its listing until the hold expires"""
+    inquiry = await database.inquiries.get(inquiry_id)
+    inquiry_buffer = getattr(app.state, "inquiry_buffer", None)
+    if not inquiry and inquiry_buffer is not None:
+        # An acknowledged inquiry may still be waiting in the write buffer
+        try:
+            if await inquiry_buffer.wait_written(inquiry_id):
+                inquiry = await database.inquiries.get(inquiry_id)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503, detail="Inquiry not written yet, please retry", headers={"Retry-After": "1"}
+            )
+    if not inquiry:
+        raise HTTPException(status_code=404, detail="Inquiry not found")
     
-    if category:
-        query["category"] = category.lower()
+    try:
+        hold = await create_hold(database, inquiry)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except BookingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
     
-    results = list(listings.find(query, {"_id": 0}).sort("created_at", -1))
-    return results
+    response_cache.invalidate(AVAILABILITY_TAG)
+    return hold
+
+@app.post("/api/holds/{hold_id}/confirm", dependencies=[require_admin, rate_limiter.dependency("holds")])
+async def confirm_hold(hold_id: str):
+    """Turn an unexpired hold into a booking"""
+    hold = await database.bookings.get_hold(hold_id)
+    if not hold:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if not await confirm_booking(database, hold):
+        raise HTTPException(status_code=409, detail="Hold has expired or is no longer active")
+    return await database.bookings.get_hold(hold_id)
+
+@app.delete("/api/holds/{hold_id}", dependencies=[require_admin])
+async def release_hold(hold_id: str):
+    """Release a hold or booking and free its nights"""
+    if not await database.bookings.release(hold_id):
+        raise HTTPException(status_code=404, detail="Hold not found")
+    response_cache.invalidate(AVAILABILITY_TAG)
+    return {"message": "Hold released", "hold_id": hold_id}
+
+@app.get("/api/search", response_model=List[Listing], dependencies=[rate_limiter.dependency("search")])
+async def search_listings(
+    q: str,
+    category: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[Literal["card"]] = None,
+):
+    """Search listings by keyword, best matches first"""
+    query = build_search_query(q, category)
+    after = decode_cursor(cursor, SEARCH_SORT)
+    selected = select_fields(fields, view, Listing.model_fields)
+    page = await response_cache.get_or_load(
+        cache_key("search", q=" ".join(q.lower().split()), category=query.get("category"), limit=limit,
+                  cursor=cursor, fields=selected),
+        lambda: database.listings.search_page(query, limit, after=after, fields=selected),
+        tags=[LISTINGS_TAG],
+    )
+    response = FastJSONResponse(page.items)
+    set_next_cursor(response, page)
+    return response
+
+@app.get("/api/suggest")
+async def suggest(
+    q: str = Query(..., max_length=100),
+    limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS),
+):
+    """Completions for a partly typed search over titles, locations and categories, typos allowed"""
+    return FastJSONResponse(await app.state.suggest_index.suggest(q, limit))
+
+def _analytics() -> InquiryAnalytics:
+    analytics = getattr(app.state, "analytics", None)
+    if analytics is None:
+        raise HTTPException(status_code=404, detail="Analytics are disabled")
+    if analytics.snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics are still loading, please retry",
+                            headers={"Retry-After": "5"})
+    return analytics
+
+@app.get("/api/analytics/listings/{listing_id}")
+async def listing_analytics(listing_id: str, days: int = Query(DEFAULT_DAYS, ge=1, le=MAX_DAYS)):
+    """Inquiry volume, conversion, lead time and rental length for one listing"""
+    analytics = _analytics()
+    if not await database.listings.exists(listing_id):
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return FastJSONResponse(analytics.listing_stats(listing_id, days))
+
+@app.get("/api/analytics/categories")
+async def category_analytics():
+    """Inquiry and booking rollups per category"""
+    return FastJSONResponse(_analytics().category_stats())
+
+# Exports bypass admission control, which they'd hold a slot of for the
+# whole download, and are capped on their own instead
+export_slots = asyncio.Semaphore(int(os.environ.get("EXPORT_MAX_CONCURRENT", 2)))
+
+class _ExportResponse(StreamingResponse):
+    """Releases its export slot once sent, failed or abandoned.
+
+    The slot is taken before the response exists and the body iterator
+    may never start (a client that disconnects first), so the release
+    wraps the whole send rather than the body.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            export_slots.release()
+
+async def _export_response(collection, projection, columns, name, format, since, after_id, batch_size):
+    if export_slots.locked():
+        raise HTTPException(
+            status_code=503, detail="Too many exports running, please retry", headers={"Retry-After": "5"}
+        )
+    cursor = export_cursor(collection, projection, since, after_id, batch_size)
+    await export_slots.acquire()
+    return _ExportResponse(
+        stream_export(cursor, format, columns, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
+
+@app.get("/api/export/listings", dependencies=[require_admin])
+async def export_listings(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE),
+):
+    """Stream every listing created after `since`, oldest first"""
+    return await _export_response(
+        database.listings.collection, LISTING_PROJECTION, LISTING_COLUMNS, "listings", format, since, after_id, batch_size
+    )
+
+@app.get("/api/export/inquiries", dependencies=[require_admin])
+async def export_inquiries(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE),
+):
+    """Stream every inquiry created after `since`, oldest first"""
+    return await _export_response(
+        database.inquiries.collection, NO_ID, INQUIRY_COLUMNS, "inquiries", format, since, after_id, batch_size
+    )
+
+@app.get("/api/images/{digest}/{name}")
+async def get_image(digest: str, name: str):
+    """Serve a stored image variant; the URL names immutable content"""
+    path = image_path(digest, name)
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(
+        path,
+        media_type=IMAGE_MEDIA_TYPES[name.rsplit(".", 1)[1]],
+        headers={"Cache-Control": IMAGE_CACHE_CONTROL},
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache and listing snapshot hit/miss counters"""
+    listing_snapshot = getattr(app.state, "listing_snapshot", None)
+    return {
+        **response_cache.stats(),
+        "snapshot": listing_snapshot.stats() if listing_snapshot is not None else None,
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,279 @@
+"""Precomputed first pages of the homepage listing grid.
+
+``GET /api/listings`` with no filters, or with only ``category``, is the
+hottest request and always runs the same query. :class:`ListingSnapshot`
+keeps the newest ``LISTING_SNAPSHOT_PAGES`` pages of it in memory, for
+all listings and for each category, and renders each page to JSON bytes
+once; serving one is a dict lookup.
+
+A write listener keeps it current in place rather than rebuilding it:
+inserts are slotted in by their sort key, updates merged into the listings
+held, and a window that loses a listing tops itself up from Mongo with
+just the missing documents. Writes made through other worker processes
+are noticed through the listings version (see conditional.py) and answered
+with a reload; until the snapshot is current again, requests take the
+normal query path.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from conditional import LISTINGS_VERSION, version_after
+from database import LISTING_PROJECTION, LISTING_SORT, Database, ListingWrite
+from facets import ATTRS_FIELD
+from pagination import DEFAULT_PAGE_SIZE, after_cursor, encode_cursor
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PAGES = int(os.environ.get("LISTING_SNAPSHOT_PAGES", 3))
+
+# Window key of the unfiltered grid; the others are category ids
+ALL = ""
+
+# A rendered page: JSON body and the cursor of the page after it
+RenderedPage = Tuple[bytes, Optional[str]]
+
+
+def snapshot_enabled() -> bool:
+    return SNAPSHOT_PAGES > 0 and os.environ.get("LISTING_SNAPSHOT", "on").lower() not in ("0", "off", "false")
+
+
+def _sort_key(listing: Dict[str, Any]) -> Tuple[datetime, str]:
+    return listing["created_at"], listing["id"]
+
+
+def _stored(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """A written listing as a read would return it."""
+    doc = {}
+    for name, value in listing.items():
+        if name in ("_id", ATTRS_FIELD):
+            continue
+        if isinstance(value, datetime):
+            # BSON dates keep milliseconds; cursors must match the stored value
+            value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+        doc[name] = value
+    return doc
+
+
+@dataclass
+class _Window:
+    listings: List[Dict[str, Any]]  # newest first
+    complete: bool  # holds every matching listing, not just the newest
+    pages: Optional[Dict[Optional[str], RenderedPage]] = field(default=None)  # by cursor, rendered lazily
+
+
+class ListingSnapshot:
+    """First pages of the default listing query, per category."""
+
+    def __init__(
+        self,
+        database: Database,
+        version: Callable[[], Awaitable[int]],
+        pages: int = SNAPSHOT_PAGES,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ):
+        self.database = database
+        self.version = version
+        self.page_size = page_size
+        # One listing past the last page tells whether it has a next cursor
+        self.depth = pages * page_size + 1
+        self._windows: Dict[str, _Window] = {}
+        # Listings version the windows reflect; None until loaded or after a failure
+        self._version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+        self._unknown_category = False
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "updates": 0, "refills": 0}
+
+    async def close(self) -> None:
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            await asyncio.gather(self._reload_task, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "current": self._version is not None,
+            "windows": len(self._windows),
+            "listings": sum(len(window.listings) for window in self._windows.values()),
+        }
+
+    # Serving
+
+    async def page(self, category: Optional[str], cursor: Optional[str]) -> Optional[RenderedPage]:
+        """The rendered page, or None when the caller must query Mongo."""
+        if self._version is None or await self.version() != self._version:
+            self._schedule_reload()
+            self._stats["misses"] += 1
+            return None
+        window = self._windows.get(category or ALL)
+        if window is None:
+            self._stats["misses"] += 1
+            return None
+        if window.pages is None:
+            window.pages = self._render(window)
+        rendered = window.pages.get(cursor)
+        self._stats["hits" if rendered else "misses"] += 1
+        return rendered
+
+    def _render(self, window: _Window) -> Dict[Optional[str], RenderedPage]:
+        pages: Dict[Optional[str], RenderedPage] = {}
+        cursor = None
+        for start in range(0, self.depth - 1, self.page_size):
+            items = window.listings[start:start + self.page_size]
+            next_cursor = None
+            if len(window.listings) > start + self.page_size:
+                next_cursor = encode_cursor(items[-1].get(key) for key, _ in LISTING_SORT)
+            pages[cursor] = (dumps(items), next_cursor)
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+        return pages
+
+    # Loading
+
+    async def load(self) -> None:
+        async with self._lock:
+            await self._load()
+
+    async def _load(self) -> None:
+        # Read before the windows: a write in between moves the version on
+        # and the next request reloads again
+        version = await self.database.versions.get(LISTINGS_VERSION)
+        categories = [count["_id"] for count in await self.database.category_counts.all()]
+        windows = {}
+        for key in [ALL] + categories:
+            listings = await self._fetch(key, None, self.depth)
+            windows[key] = _Window(listings, complete=len(listings) < self.depth)
+        self._windows = windows
+        self._version = version
+        self._stats["reloads"] += 1
+
+    async def _fetch(self, key: str, after: Optional[List[Any]], limit: int) -> List[Dict[str, Any]]:
+        query = {"available": True, **({"category": key} if key != ALL else {})}
+        cursor = (
+            self.database.listings.collection.find(after_cursor(query, LISTING_SORT, after), LISTING_PROJECTION)
+            .sort(LISTING_SORT)
+            .limit(limit)
+        )
+        return await cursor.to_list(length=None)
+
+    def _schedule_reload(self) -> None:
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self) -> None:
+        try:
+            async with self._lock:
+                # A write listener may have caught up while this waited
+                if self._version is not None and await self.database.versions.get(LISTINGS_VERSION) == self._version:
+                    return
+                await self._load()
+        except Exception:
+            logger.exception("Could not reload the listing snapshot")
+
+    # Incremental refresh
+
+    def listener(self):
+        """Listing write listener patching the windows a write touches."""
+
+        async def on_write(write: ListingWrite) -> None:
+            async with self._lock:
+                previous = self._version
+                if previous is None:
+                    return
+                try:
+                    current = await self._apply(write)
+                    version = await version_after(self.database, write, previous)
+                except Exception:
+                    logger.exception("Could not update the listing snapshot")
+                    current = False
+                self._stats["updates"] += 1
+                self._version = version if current else None
+
+        return on_write
+
+    async def _apply(self, write: ListingWrite) -> bool:
+        """Patch the windows; False if they can't reflect the write."""
+        held = {listing["id"]: listing for window in self._windows.values() for listing in window.listings}
+        existed = {doc["id"] for doc in write.previous}
+        self._unknown_category = False
+        touched = set()
+        fetch = []
+        for listing in write.listings:
+            doc = _stored(listing)
+            if write.op == "insert" or (write.op == "upsert" and doc["id"] not in existed):
+                touched |= self._remove(doc["id"], held)
+                touched |= self._place(doc)
+                continue
+            if write.op == "upsert":
+                # The stored created_at is kept on upsert, not the one passed in
+                doc.pop("created_at", None)
+            current = held.get(doc["id"])
+            if current is not None:
+                touched |= self._remove(doc["id"], held)
+                touched |= self._place({**current, **doc})
+            elif doc.get("available") or "category" in doc or "created_at" in doc:
+                # May have moved into a window; needs its stored document
+                fetch.append(doc["id"])
+        if fetch:
+            cursor = self.database.listings.collection.find(
+                {"id": {"$in": fetch}, "available": True}, LISTING_PROJECTION
+            )
+            async for doc in cursor:
+                touched |= self._place(doc)
+        for key in touched:
+            await self._refill(key)
+        return not self._unknown_category
+
+    def _remove(self, listing_id: str, held: Dict[str, Dict[str, Any]]) -> set:
+        current = held.pop(listing_id, None)
+        if current is None:
+            return set()
+        touched = set()
+        for key in (ALL, current["category"]):
+            window = self._windows.get(key)
+            if window is not None:
+                window.listings = [listing for listing in window.listings if listing["id"] != listing_id]
+                touched.add(key)
+        return touched
+
+    def _place(self, doc: Dict[str, Any]) -> set:
+        if not doc.get("available"):
+            return set()
+        touched = set()
+        for key in (ALL, doc["category"]):
+            window = self._windows.get(key)
+            if window is None:
+                # A category that had no listings when loaded
+                self._unknown_category = True
+                continue
+            sort_key = _sort_key(doc)
+            position = next(
+                (i for i, listing in enumerate(window.listings) if _sort_key(listing) < sort_key),
+                len(window.listings),
+            )
+            if position == len(window.listings) and not window.complete:
+                continue  # older than anything held
+            window.listings.insert(position, doc)
+            if len(window.listings) > self.depth:
+                window.listings.pop()
+                window.complete = False
+            touched.add(key)
+        return touched
+
+    async def _refill(self, key: str) -> None:
+        window = self._windows[key]
+        window.pages = None
+        missing = self.depth - len(window.listings)
+        if missing <= 0 or window.complete:
+            return
+        after = [window.listings[-1].get(name) for name, _ in LISTING_SORT] if window.listings else None
+        more = await self._fetch(key, after, missing)
+        window.listings.extend(more)
+        window.complete = len(more) < missing
+        self._stats["refills"] += 1
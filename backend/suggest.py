@@ -0,0 +1,342 @@
+"""Typo-tolerant autocomplete behind ``GET /api/suggest``.
+
+:class:`SuggestIndex` is an in-memory prefix trie over the vocabulary of
+available listings: title words, whole locations and category ids, each
+with the number of listings that use it. Every trie node keeps the
+``MAX_SUGGESTIONS`` most used terms below it, so completing a prefix reads
+one node instead of walking its subtree, and memory grows with the number
+of distinct terms, not with the number of listings.
+
+Typos are matched by walking the trie with a row of the (Damerau-)
+Levenshtein table against the query, pruning branches that are already
+more than ``max_edits`` away. Exact prefixes rank first, then more common
+terms.
+
+The index is built from ``listings`` at startup and patched by a write
+listener. Writes made through other worker processes are noticed through
+the listings version (see conditional.py) and trigger a rebuild in the
+background, at most every ``SUGGEST_REBUILD_SECONDS``; suggestions are
+served from the previous index meanwhile.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from categories import CATEGORY_INFO
+from conditional import LISTINGS_VERSION, version_after
+from database import Database, ListingWrite
+
+logger = logging.getLogger(__name__)
+
+MAX_SUGGESTIONS = 10
+DEFAULT_SUGGESTIONS = 5
+REBUILD_INTERVAL = float(os.environ.get("SUGGEST_REBUILD_SECONDS", 30))
+
+# When two kinds share a term, it is shown as the first one here
+KINDS = ("category", "location", "title")
+STOPWORDS = frozenset({"a", "an", "and", "at", "by", "for", "in", "of", "on", "the", "to", "with"})
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def max_edits(query: str) -> int:
+    """Typos tolerated for a query of this length."""
+    if len(query) < 3:
+        return 0
+    return 1 if len(query) < 6 else 2
+
+
+def listing_terms(listing: Dict[str, Any]) -> Dict[Tuple[str, str], str]:
+    """``{(term, kind): display}`` for one listing."""
+    terms = {}
+    for word in _WORD.findall((listing.get("title") or "").lower()):
+        if len(word) > 1 and not word.isdigit() and word not in STOPWORDS:
+            terms[(word, "title")] = word
+    location = (listing.get("location") or "").strip()
+    if location:
+        terms[(normalize(location), "location")] = location
+    category = listing.get("category")
+    if category:
+        terms[(category, "category")] = CATEGORY_INFO.get(category, {}).get("name", category)
+    return terms
+
+
+class _Term:
+    __slots__ = ("counts", "displays")
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.displays: Dict[str, str] = {}
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def kind(self) -> str:
+        return next(kind for kind in KINDS if kind in self.counts)
+
+
+class _Node:
+    __slots__ = ("children", "term", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.term: Optional[str] = None  # the term ending here, if any
+        self.top: List[str] = []  # most used terms in this subtree
+
+
+class _Trie:
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.root = _Node()
+        self.terms: Dict[str, _Term] = {}
+
+    def _rank(self, term: str) -> Tuple[int, str]:
+        return -self.terms[term].count, term
+
+    def _best(self, node: _Node) -> List[str]:
+        candidates = [term for child in node.children.values() for term in child.top]
+        if node.term is not None:
+            candidates.append(node.term)
+        return sorted(candidates, key=self._rank)[:self.top_k]
+
+    def adjust(self, term: str, kind: str, display: str, delta: int) -> None:
+        entry = self.terms.get(term)
+        if entry is None:
+            if delta <= 0:
+                return
+            entry = self.terms[term] = _Term()
+        count = entry.counts.get(kind, 0) + delta
+        if count > 0:
+            entry.counts[kind] = count
+            entry.displays.setdefault(kind, display)
+        else:
+            entry.counts.pop(kind, None)
+            entry.displays.pop(kind, None)
+
+        path = [self.root]
+        for char in term:
+            path.append(path[-1].children.setdefault(char, _Node()))
+        if entry.counts:
+            path[-1].term = term
+        else:
+            del self.terms[term]
+            path[-1].term = None
+        # Children before parents: each top list is merged from the ones below
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and node.term is None and not node.children:
+                del path[depth - 1].children[term[depth - 1]]
+            elif term not in node.top and (
+                delta < 0 or (len(node.top) == self.top_k and self._rank(term) > self._rank(node.top[-1]))
+            ):
+                break  # not among the best here, so not further up either
+            else:
+                node.top = self._best(node)
+
+    def build_tops(self) -> None:
+        """Fill every top list after terms were added with :meth:`add_term`."""
+        stack = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                node.top = self._best(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+
+    def add_term(self, term: str, kind: str, display: str, count: int) -> None:
+        entry = self.terms.setdefault(term, _Term())
+        entry.counts[kind] = count
+        entry.displays.setdefault(kind, display)
+        node = self.root
+        for char in term:
+            node = node.children.setdefault(char, _Node())
+        node.term = term
+
+    def match(self, query: str, edits: int, limit: int) -> Dict[str, int]:
+        """Terms with a prefix within ``edits`` of ``query``, with that distance.
+
+        Exact prefix matches come first. One typo is looked for while there
+        are fewer than ``limit`` matches, two only if there is none at all,
+        and never in the first character, which keeps the walk small.
+        """
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                break
+        found = {term: 0 for term in node.top} if node is not None else {}
+        for allowed in range(1, edits + 1):
+            if len(found) >= limit or (allowed > 1 and found):
+                break
+            start = self.root.children.get(query[0])
+            if start is not None:
+                self._fuzzy(query, allowed, start, found)
+        return found
+
+    def _fuzzy(self, query: str, edits: int, start: _Node, found: Dict[str, int]) -> None:
+        size = len(query)
+        beyond = edits + 1
+        first = [1] + [i - 1 for i in range(1, size + 1)]  # row after the exact first character
+        # (node, depth, its char, row above, row two above, char above, best distance on the path)
+        stack = [(child, 2, char, first, None, query[0], beyond) for char, child in start.children.items()]
+        if first[-1] <= edits:
+            for term in start.top:
+                found.setdefault(term, first[-1])
+        while stack:
+            node, depth, char, above, above2, char_above, best = stack.pop()
+            row = [depth] + [beyond] * size
+            lowest = depth
+            # Cells further than ``edits`` off the diagonal can't be in reach
+            for i in range(max(1, depth - edits), min(size, depth + edits) + 1):
+                wanted = query[i - 1]
+                cost = above[i - 1] if wanted == char else above[i - 1] + 1
+                if row[i - 1] + 1 < cost:
+                    cost = row[i - 1] + 1
+                if above[i] + 1 < cost:
+                    cost = above[i] + 1
+                if wanted == char_above and i > 1 and query[i - 2] == char and above2 is not None:
+                    cost = min(cost, above2[i - 2] + 1)  # transposed pair
+                if cost < beyond:
+                    row[i] = cost
+                    if cost < lowest:
+                        lowest = cost
+            if row[-1] < best:
+                best = row[-1]
+                for term in node.top:
+                    if found.get(term, beyond) > best:
+                        found[term] = best
+            # Deeper nodes only matter if they can still beat this path
+            if lowest < best:
+                stack.extend(
+                    (child, depth + 1, next_char, row, above, char, best) for next_char, child in node.children.items()
+                )
+
+
+class SuggestIndex:
+    """Autocomplete over the listing vocabulary, kept current by writes."""
+
+    def __init__(
+        self,
+        database: Database,
+        version: Callable[[], Awaitable[int]],
+        top_k: int = MAX_SUGGESTIONS,
+        rebuild_interval: float = REBUILD_INTERVAL,
+    ):
+        self.database = database
+        self.version = version
+        self.top_k = top_k
+        self.rebuild_interval = rebuild_interval
+        self._trie = _Trie(top_k)
+        # Listings version the trie reflects; None if unknown
+        self._version: Optional[int] = None
+        self._built_at = float("-inf")
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    @property
+    def terms(self) -> int:
+        return len(self._trie.terms)
+
+    async def close(self) -> None:
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            await asyncio.gather(self._rebuild_task, return_exceptions=True)
+
+    async def build(self) -> None:
+        """Count the vocabulary of every available listing and swap in a new trie."""
+        version = await self.database.versions.get(LISTINGS_VERSION)
+        counts: Counter = Counter()
+        displays: Dict[Tuple[str, str], str] = {}
+        cursor = self.database.listings.collection.find(
+            {"available": True}, {"_id": 0, "title": 1, "location": 1, "category": 1}
+        )
+        async for listing in cursor:
+            for key, display in listing_terms(listing).items():
+                counts[key] += 1
+                displays.setdefault(key, display)
+        trie = _Trie(self.top_k)
+        for (term, kind), count in counts.items():
+            trie.add_term(term, kind, displays[(term, kind)], count)
+        trie.build_tops()
+        self._trie = trie
+        self._version = version
+        self._built_at = time.monotonic()
+
+    # Querying
+
+    async def suggest(self, q: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict[str, Any]]:
+        await self._check_version()
+        query = normalize(q)
+        if not query:
+            return []
+        trie = self._trie
+        candidates: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        prefixes = [("", query)]
+        if " " in query:
+            # Also complete the last word on its own, keeping the words before it
+            head, _, last = query.rpartition(" ")
+            prefixes.append((head + " ", last))
+        for head, prefix in prefixes:
+            for term, distance in trie.match(prefix, max_edits(prefix), limit).items():
+                entry = trie.terms[term]
+                text = head + entry.displays[entry.kind]
+                candidates.setdefault((text, entry.kind), (distance, term))
+        ranked = sorted(
+            candidates.items(),
+            key=lambda item: (item[1][0], -trie.terms[item[1][1]].count, item[0][0]),
+        )
+        return [
+            {"text": text, "kind": kind, "count": trie.terms[term].count, "exact": distance == 0}
+            for (text, kind), (distance, term) in ranked[:limit]
+        ]
+
+    async def _check_version(self) -> None:
+        if self._version is not None and await self.version() == self._version:
+            return
+        due = time.monotonic() - self._built_at >= self.rebuild_interval
+        if due and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.create_task(self._rebuild())
+
+    async def _rebuild(self) -> None:
+        try:
+            await self.build()
+        except Exception:
+            logger.exception("Could not rebuild the suggestion index")
+
+    # Incremental refresh
+
+    def listener(self):
+        """Listing write listener moving term counts from old values to new."""
+
+        async def on_write(write: ListingWrite) -> None:
+            trie, previous_version = self._trie, self._version
+            before = {doc["id"]: doc for doc in write.previous}
+            for listing in write.listings:
+                old = before.get(listing["id"])
+                if write.op == "update" and old is None:
+                    continue  # wrote none of the indexed fields
+                new = {**old, **listing} if old is not None else listing
+                self._apply(trie, old, -1)
+                self._apply(trie, new, +1)
+            version = await version_after(self.database, write, previous_version)
+            if self._trie is trie:  # else a rebuild swapped the trie meanwhile
+                self._version = version
+
+        return on_write
+
+    @staticmethod
+    def _apply(trie: _Trie, listing: Optional[Dict[str, Any]], delta: int) -> None:
+        if listing is None or not listing.get("available", True):
+            return
+        for (term, kind), display in listing_terms(listing).items():
+            trie.adjust(term, kind, display, delta)
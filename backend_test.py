@@ -1,6 +1,10 @@
+import asyncio
 import requests
 import unittest
 import json
+import os
+import sys
+import time
 from datetime import datetime, timedelta
 
 class RentalMarketplaceAPITest(unittest.TestCase):
@@ -290,5 +294,560 @@ class RentalMarketplaceAPITest(unittest.TestCase):
         self.assertIn("inquiry_id", result)
         print("✅ Test inquiry submitted successfully")
 
+    def test_11_listings_pagination(self):
+        """Test keyset pagination and card projection on listings"""
+        print("\n🔍 Testing listings pagination...")
+        
+        response = requests.get(f"{self.base_url}/api/listings?limit=2&view=card")
+        self.assertEqual(response.status_code, 200)
+        first_page = response.json()
+        self.assertLessEqual(len(first_page), 2)
+        for listing in first_page:
+            self.assertNotIn("description", listing)
+            self.assertNotIn("specifications", listing)
+        
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            print("⚠️ Only one page of listings available")
+            return
+        
+        response = requests.get(f"{self.base_url}/api/listings?limit=2&view=card&cursor={next_cursor}")
+        self.assertEqual(response.status_code, 200)
+        second_page = response.json()
+        first_ids = {listing["id"] for listing in first_page}
+        self.assertFalse(first_ids & {listing["id"] for listing in second_page})
+        print(f"✅ Paged through listings without overlap ({len(first_page)} + {len(second_page)})")
+        
+        response = requests.get(f"{self.base_url}/api/listings?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        print("✅ Invalid cursor is rejected")
+        
+        # [{"$ne": null}, "z"]: decodes, but an operator is no sort key value
+        response = requests.get(f"{self.base_url}/api/listings?cursor=W3siJG5lIjpudWxsfSwieiJd")
+        self.assertEqual(response.status_code, 400)
+        print("✅ Cursor carrying a query operator is rejected")
+
+    def test_12_cache_stats(self):
+        """Test that repeated reads are served from the response cache"""
+        print("\n🔍 Testing response cache stats...")
+        
+        requests.get(f"{self.base_url}/api/categories")
+        before = requests.get(f"{self.base_url}/api/cache/stats").json()
+        requests.get(f"{self.base_url}/api/categories")
+        after = requests.get(f"{self.base_url}/api/cache/stats").json()
+        
+        for key in ["hits", "misses", "evictions", "size"]:
+            self.assertIn(key, after)
+        self.assertGreater(after["hits"], before["hits"])
+        print(f"✅ Cache hit ratio: {after['hit_ratio']}")
+
+    def test_13_conditional_get(self):
+        """Test ETag revalidation on listings and categories"""
+        print("\n🔍 Testing conditional GET...")
+        
+        for path in ["/api/listings", "/api/categories"]:
+            response = requests.get(f"{self.base_url}{path}")
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers.get("ETag")
+            self.assertIsNotNone(etag, f"No ETag on {path}")
+            
+            self.assertTrue(etag.startswith('W/"'), f"Expected a weak ETag on {path}")
+            
+            # Weak comparison: with or without W/, a list, or *
+            for candidate in (etag, etag[2:], f'"other", {etag}', "*"):
+                response = requests.get(f"{self.base_url}{path}", headers={"If-None-Match": candidate})
+                self.assertEqual(response.status_code, 304, candidate)
+                self.assertEqual(response.content, b"")
+            print(f"✅ {path} answers If-None-Match with 304")
+
+    def test_14_bulk_inquiries(self):
+        """Test submitting a batch of inquiries"""
+        print("\n🔍 Testing bulk inquiry submission...")
+        
+        listings_response = requests.get(f"{self.base_url}/api/listings")
+        listings = listings_response.json()
+        if not listings:
+            self.fail("No listings available to test bulk inquiries")
+        
+        batch = [
+            {**self.test_inquiry, "listing_id": listings[0]["id"]},
+            {**self.test_inquiry, "listing_id": listings[-1]["id"]},
+            {**self.test_inquiry, "listing_id": "non-existent-listing"},
+        ]
+        response = requests.post(f"{self.base_url}/api/inquiries/bulk", headers=self.headers, json=batch)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result["inquiry_ids"]), 2)
+        self.assertEqual([error["index"] for error in result["errors"]], [2])
+        print("✅ Bulk inquiries accepted with per-item errors")
+
+    def test_15_nearby_listings(self):
+        """Test radius search around Los Angeles"""
+        print("\n🔍 Testing nearby listings...")
+        
+        response = requests.get(f"{self.base_url}/api/listings/nearby?lat=34.0522&lng=-118.2437&radius_km=100")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertIsInstance(results, list)
+        
+        distances = [listing["distance_km"] for listing in results]
+        self.assertEqual(distances, sorted(distances))
+        self.assertTrue(all(distance <= 100 for distance in distances))
+        print(f"✅ Nearby search returned {len(results)} listings sorted by distance")
+        
+        response = requests.get(f"{self.base_url}/api/listings/nearby?lat=200&lng=0")
+        self.assertEqual(response.status_code, 422)
+        print("✅ Out-of-range coordinates are rejected")
+
+    def test_16_booking_holds(self):
+        """Test holding an inquiry's dates and rejecting overlapping holds"""
+        print("\n🔍 Testing booking holds...")
+        
+        listings_response = requests.get(f"{self.base_url}/api/listings")
+        listings = listings_response.json()
+        if not listings:
+            self.fail("No listings available to test booking holds")
+        
+        listing_id = listings[0]["id"]
+        start = datetime.now() + timedelta(days=300)
+        inquiry_ids = []
+        for offset in [0, 2]:
+            inquiry_data = {
+                **self.test_inquiry,
+                "listing_id": listing_id,
+                "start_date": (start + timedelta(days=offset)).strftime('%Y-%m-%d'),
+                "end_date": (start + timedelta(days=offset + 4)).strftime('%Y-%m-%d'),
+            }
+            response = requests.post(f"{self.base_url}/api/inquiries", headers=self.headers, json=inquiry_data)
+            self.assertEqual(response.status_code, 200)
+            inquiry_ids.append(response.json()["inquiry_id"])
+        
+        response = requests.post(f"{self.base_url}/api/inquiries/{inquiry_ids[0]}/hold")
+        self.assertIn(response.status_code, (401, 403))
+        print("✅ Hold refused without the admin credential")
+        
+        token = os.environ.get("ADMIN_TOKEN")
+        if not token:
+            self.skipTest("ADMIN_TOKEN not set")
+        admin = {"Authorization": f"Bearer {token}"}
+        response = requests.post(f"{self.base_url}/api/inquiries/{inquiry_ids[0]}/hold", headers=admin)
+        self.assertEqual(response.status_code, 200)
+        hold = response.json()
+        self.assertEqual(hold["status"], "held")
+        print("✅ Hold created")
+        
+        response = requests.post(f"{self.base_url}/api/inquiries/{inquiry_ids[1]}/hold", headers=admin)
+        self.assertEqual(response.status_code, 409)
+        print("✅ Overlapping hold rejected")
+        
+        free_from = (start + timedelta(days=1)).strftime('%Y-%m-%d')
+        free_to = (start + timedelta(days=2)).strftime('%Y-%m-%d')
+        response = requests.get(f"{self.base_url}/api/listings?available_from={free_from}&available_to={free_to}")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(listing_id, [listing["id"] for listing in response.json()])
+        print("✅ Held listing excluded from date-range results")
+        
+        response = requests.post(f"{self.base_url}/api/holds/{hold['id']}/confirm", headers=admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "confirmed")
+        print("✅ Hold confirmed")
+        
+        response = requests.delete(f"{self.base_url}/api/holds/{hold['id']}")
+        self.assertEqual(response.status_code, 401)
+        print("✅ Booking release refused without the admin credential")
+        
+        response = requests.delete(f"{self.base_url}/api/holds/{hold['id']}", headers=admin)
+        self.assertEqual(response.status_code, 200)
+        print("✅ Booking released")
+
+    def test_17_metrics_and_health(self):
+        """Test the Prometheus endpoint and database health details"""
+        print("\n🔍 Testing metrics and health details...")
+        
+        response = requests.get(f"{self.base_url}/api/health")
+        self.assertEqual(response.status_code, 200)
+        health = response.json()
+        self.assertIn("ping_ms", health["database"])
+        self.assertIn("saturation", health["pool"])
+        print(f"✅ Database ping: {health['database']['ping_ms']}ms")
+        
+        requests.get(f"{self.base_url}/api/listings")
+        response = requests.get(f"{self.base_url}/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/api/listings"', response.text)
+        print("✅ Metrics endpoint exposes per-route latency")
+
+    def test_18_export_streams(self):
+        """Test NDJSON and CSV exports"""
+        print("\n🔍 Testing streaming exports...")
+        
+        token = os.environ.get("ADMIN_TOKEN")
+        for path in ("/api/export/listings", "/api/export/inquiries"):
+            response = requests.get(f"{self.base_url}{path}")
+            self.assertEqual(response.status_code, 401 if token else 403)
+        print("✅ Exports refused without the admin credential")
+        
+        if not token:
+            self.skipTest("ADMIN_TOKEN not set")
+        headers = {"Authorization": f"Bearer {token}"}
+        response = requests.get(f"{self.base_url}/api/export/listings", params={"batch_size": 2}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertGreater(len(rows), 0)
+        print(f"✅ Exported {len(rows)} listings as NDJSON")
+        
+        last = rows[0]
+        response = requests.get(
+            f"{self.base_url}/api/export/listings",
+            params={"since": last["created_at"], "after_id": last["id"]},
+            headers=headers,
+        )
+        later = [json.loads(line)["id"] for line in response.text.splitlines()]
+        self.assertEqual(later, [row["id"] for row in rows[1:]])
+        print("✅ Incremental export resumes after the last row")
+        
+        response = requests.get(f"{self.base_url}/api/export/inquiries", params={"format": "csv"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.text.startswith("id,listing_id,"))
+        print("✅ Inquiries exported as CSV")
+
+    def test_19_bulk_import(self):
+        """Test the idempotent bulk listing import"""
+        print("\n🔍 Testing bulk listing import...")
+        
+        listing = {
+            "id": "import-test-listing",
+            "title": "Imported Test Kayak",
+            "description": "A kayak loaded through the bulk import endpoint.",
+            "category": "boats",
+            "price_per_day": 45.0,
+            "location": "Seattle, WA",
+            "owner_name": "Import Test",
+            "owner_contact": "import@example.com",
+        }
+        body = json.dumps(listing) + "\n" + json.dumps({"id": "import-test-invalid"}) + "\n"
+        response = requests.post(f"{self.base_url}/api/listings/import", data=body)
+        self.assertIn(response.status_code, (401, 403))
+        print("✅ Import refused without the admin credential")
+        
+        token = os.environ.get("ADMIN_TOKEN")
+        if not token:
+            self.skipTest("ADMIN_TOKEN not set")
+        headers = {"Authorization": f"Bearer {token}"}
+        for attempt in range(2):
+            response = requests.post(f"{self.base_url}/api/listings/import", data=body, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            report = response.json()
+            self.assertEqual(report["written"], 1)
+            self.assertEqual(report["failed"], 1)
+            self.assertEqual(report["errors"][0]["index"], 1)
+        print("✅ Import is idempotent and reports invalid rows")
+        
+        undecodable = body.encode() + b'{"id": "import-test-latin1", "title": "Caf\xe9"}\n'
+        response = requests.post(f"{self.base_url}/api/listings/import", data=undecodable, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["written"], 1)
+        self.assertEqual(report["errors"][-1]["index"], 2)
+        self.assertIn("Line 3 is not valid UTF-8", report["errors"][-1]["detail"])
+        print("✅ Invalid UTF-8 rejected as a row error")
+        
+        response = requests.get(f"{self.base_url}/api/listings/import-test-listing")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], listing["title"])
+        print("✅ Imported listing is served")
+
+    def test_20_facets_and_filters(self):
+        """Test facet counts and the price/spec filters"""
+        print("\n🔍 Testing facets and filters...")
+        
+        response = requests.get(f"{self.base_url}/api/listings/facets")
+        self.assertEqual(response.status_code, 200)
+        facets = response.json()
+        for key in ("total", "categories", "price", "specs"):
+            self.assertIn(key, facets)
+        self.assertEqual(sum(bucket["count"] for bucket in facets["price"]), facets["total"])
+        print(f"✅ Facets over {facets['total']} listings, {len(facets['specs'])} spec keys")
+        
+        response = requests.get(f"{self.base_url}/api/listings", params={"min_price": 500, "max_price": 1000})
+        self.assertEqual(response.status_code, 200)
+        for listing in response.json():
+            self.assertTrue(500 <= listing["price_per_day"] <= 1000)
+        print("✅ Price filter applied")
+        
+        response = requests.get(f"{self.base_url}/api/listings", params={"spec": "seats:2..4"})
+        self.assertEqual(response.status_code, 200)
+        for listing in response.json():
+            self.assertTrue(2 <= listing["specifications"]["seats"] <= 4)
+        response = requests.get(f"{self.base_url}/api/listings", params={"spec": "seats"})
+        self.assertEqual(response.status_code, 400)
+        print("✅ Spec filter applied and validated")
+
+    def test_21_image_variants(self):
+        """Test image variant fields and the image endpoint"""
+        print("\n🔍 Testing image variants...")
+        
+        response = requests.get(f"{self.base_url}/api/listings", params={"view": "card"})
+        self.assertEqual(response.status_code, 200)
+        variants = [variant for listing in response.json() for variant in listing.get("image_variants", [])]
+        print(f"✅ {len(variants)} processed images in the first page")
+        
+        for variant in variants[:1]:
+            response = requests.get(f"{self.base_url}{variant['thumbnail']}")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("immutable", response.headers["Cache-Control"])
+            print("✅ Thumbnail served with immutable caching")
+        
+        response = requests.get(f"{self.base_url}/api/images/{'0' * 64}/320.webp")
+        self.assertEqual(response.status_code, 404)
+        print("✅ Unknown image returns 404")
+
+    def test_22_listing_stream(self):
+        """Test the server-sent listing event stream"""
+        print("\n🔍 Testing live listing stream...")
+        
+        with requests.get(f"{self.base_url}/api/listings/stream", stream=True, timeout=10) as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+            self.assertNotIn("etag", response.headers)
+            first_line = next(response.iter_lines(decode_unicode=True))
+            self.assertTrue(first_line.startswith("retry:"))
+        print("✅ Stream opened with a retry hint")
+        
+        with requests.get(
+            f"{self.base_url}/api/listings/stream",
+            headers={"Last-Event-ID": "unknown-1"},
+            stream=True,
+            timeout=10,
+        ) as response:
+            lines = response.iter_lines(decode_unicode=True)
+            self.assertIn("event: reset", [next(lines) for _ in range(3)])
+        print("✅ Unknown Last-Event-ID asks the client to reset")
+
+    def test_23_rate_limits(self):
+        """Test per-client rate limiting on bulk inquiries"""
+        print("\n🔍 Testing rate limits...")
+        
+        # The bulk endpoint allows a burst of 2 per client by default
+        responses = [requests.post(f"{self.base_url}/api/inquiries/bulk", json=[]) for _ in range(4)]
+        limited = [response for response in responses if response.status_code == 429]
+        self.assertTrue(limited, "Expected at least one 429 response")
+        self.assertGreaterEqual(int(limited[0].headers["retry-after"]), 1)
+        print(f"✅ {len(limited)} of {len(responses)} requests were rate limited")
+        
+        response = requests.get(f"{self.base_url}/api/metrics")
+        self.assertIn("http_rate_limited_total", response.text)
+        print("✅ Rate limited requests are counted in metrics")
+
+    def test_24_listing_snapshot(self):
+        """Test that precomputed homepage pages match a fresh query"""
+        print("\n🔍 Testing listing snapshot...")
+        
+        for params in ({}, {"category": "cars"}):
+            snapshot = requests.get(f"{self.base_url}/api/listings", params=params)
+            # A price filter skips the snapshot but matches the same listings
+            queried = requests.get(f"{self.base_url}/api/listings", params={**params, "min_price": 0})
+            self.assertEqual(snapshot.status_code, 200)
+            self.assertEqual(snapshot.json(), queried.json())
+            self.assertEqual(snapshot.headers.get("x-next-cursor"), queried.headers.get("x-next-cursor"))
+        print("✅ Snapshot pages match the queried pages")
+        
+        stats = requests.get(f"{self.base_url}/api/cache/stats").json()
+        if stats.get("snapshot"):
+            self.assertIn("hits", stats["snapshot"])
+            print(f"✅ Snapshot stats: {stats['snapshot']}")
+
+    def test_25_suggest(self):
+        """Test typo-tolerant autocomplete"""
+        print("\n🔍 Testing suggestions...")
+        
+        response = requests.get(f"{self.base_url}/api/suggest", params={"q": "yac"})
+        self.assertEqual(response.status_code, 200)
+        suggestions = response.json()
+        self.assertTrue(suggestions, "Expected completions for 'yac'")
+        for suggestion in suggestions:
+            self.assertIn(suggestion["kind"], ("category", "location", "title"))
+            self.assertTrue(suggestion["exact"])
+        print(f"✅ 'yac' completes to {[s['text'] for s in suggestions]}")
+        
+        response = requests.get(f"{self.base_url}/api/suggest", params={"q": "yatch"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("yacht", [s["text"].lower() for s in response.json()])
+        print("✅ 'yatch' is corrected to 'yacht'")
+        
+        response = requests.get(f"{self.base_url}/api/suggest", params={"q": "a", "limit": 50})
+        self.assertEqual(response.status_code, 422)
+        print("✅ Oversized limit rejected")
+
+    def test_26_inquiry_analytics(self):
+        """Test per-listing and per-category inquiry analytics"""
+        print("\n📊 Testing inquiry analytics...")
+        
+        listing_id = requests.get(f"{self.base_url}/api/listings", params={"limit": 1}).json()[0]["id"]
+        url = f"{self.base_url}/api/analytics/listings/{listing_id}"
+        response = requests.get(url, params={"days": 7})
+        for _ in range(10):
+            if response.status_code != 503:
+                break
+            time.sleep(1)  # first snapshot still loading
+            response = requests.get(url, params={"days": 7})
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        for key in ("inquiries", "bookings", "conversion_rate", "inquiries_per_day", "lead_time_days", "rental_nights"):
+            self.assertIn(key, stats)
+        self.assertEqual(len(stats["inquiries_per_day"]), 7)
+        print(f"✅ Listing stats: {stats['inquiries']} inquiries, {stats['bookings']} bookings")
+        
+        response = requests.get(f"{self.base_url}/api/analytics/categories")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json()["categories"], list)
+        print(f"✅ Category rollups for {len(response.json()['categories'])} categories")
+        
+        response = requests.get(f"{self.base_url}/api/analytics/listings/no-such-listing")
+        self.assertEqual(response.status_code, 404)
+        print("✅ Unknown listing returns 404")
+
+
+def use_backend_modules():
+    """Make the backend's flat modules importable for the in-process tests"""
+    backend = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+
+
+class CategoryCounterTest(unittest.IsolatedAsyncioTestCase):
+    """In-process checks of the category counters against a mongomock database"""
+
+    async def asyncSetUp(self):
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            self.skipTest("mongomock-motor is not installed")
+        use_backend_modules()
+        from database import Database
+        import categories
+        self.categories = categories
+        self.database = Database()
+        self.database.connect(client=AsyncMongoMockClient())
+        self.database.listings.add_listener(categories.counter_listener(self.database))
+
+    async def counts(self):
+        return {doc["_id"]: doc["count"] for doc in await self.database.category_counts.all()}
+
+    async def test_counters_match_rebuild(self):
+        """Test that inserts and updates keep the counters equal to a rebuild"""
+        print("\n🔢 Testing category counters...")
+        
+        listings = self.database.listings
+        await listings.insert_many([
+            {"id": f"listing-{n}", "category": "cars" if n < 3 else "boats", "available": n != 4, "title": f"Listing {n}"}
+            for n in range(6)
+        ])
+        self.assertEqual(await self.counts(), {"cars": 3, "boats": 2})
+        
+        await listings.update_fields({
+            "listing-0": {"category": "bikes"},
+            "listing-1": {"available": False},
+            "listing-4": {"available": True, "category": "yachts"},
+            "listing-5": {"title": "Renamed"},
+        })
+        expected = {"cars": 1, "bikes": 1, "boats": 2, "yachts": 1}
+        self.assertEqual(await self.counts(), expected)
+        self.assertEqual(await self.categories.rebuild_category_counts(self.database), expected)
+        print(f"✅ Counters after updates match a rebuild: {expected}")
+        
+        # Drifted counters are repaired by the rebuild
+        await self.database.category_counts.increment({"cars": 5, "planes": 2})
+        await self.categories.rebuild_category_counts(self.database)
+        self.assertEqual(await self.counts(), expected)
+        print("✅ Rebuild repairs drifted counters")
+
+
+class ExportSlotTest(unittest.IsolatedAsyncioTestCase):
+    """In-process checks that export responses give back their slot"""
+
+    async def asyncSetUp(self):
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            self.skipTest("mongomock-motor is not installed")
+        use_backend_modules()
+        import server
+        self.server = server
+        self.collection = AsyncMongoMockClient()["export_test"]["inquiries"]
+
+    async def test_slot_released_on_early_disconnect(self):
+        """Test that a client leaving before the first chunk frees its export slot"""
+        print("\n🔌 Testing export slots on disconnect...")
+        
+        slots = self.server.export_slots._value
+        scope = {"type": "http", "method": "GET", "path": "/api/export/inquiries", "headers": []}
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                await asyncio.sleep(1)  # slow to start; the disconnect wins
+            else:
+                self.fail("no body should be sent after the disconnect")
+
+        for _ in range(slots + 1):
+            response = await self.server._export_response(
+                self.collection, {"_id": 0}, ["id"], "inquiries", "ndjson", None, None, 10
+            )
+            await response(scope, receive, send)
+            self.assertEqual(self.server.export_slots._value, slots)
+        print(f"✅ All {slots} export slots free after {slots + 1} abandoned exports")
+
+
+class InquiryBufferTest(unittest.IsolatedAsyncioTestCase):
+    """In-process checks of buffered inquiries against a mongomock database"""
+
+    async def asyncSetUp(self):
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            self.skipTest("mongomock-motor is not installed")
+        use_backend_modules()
+        import server
+        from inquiries import InquiryBuffer
+        self.server = server
+        server.database.connect(client=AsyncMongoMockClient())
+        # A long interval keeps the inquiry queued until the route waits for it
+        self.buffer = InquiryBuffer(server.database.inquiries, flush_interval=0.5)
+        self.buffer.start()
+        server.app.state.inquiry_buffer = self.buffer
+
+    async def asyncTearDown(self):
+        await self.buffer.close()
+        del self.server.app.state.inquiry_buffer
+        self.server.database.close()
+
+    async def test_hold_waits_for_buffered_inquiry(self):
+        """Test that holding a just-acknowledged buffered inquiry finds it"""
+        print("\n📥 Testing holds on buffered inquiries...")
+        
+        start = datetime.now() + timedelta(days=30)
+        inquiry = {
+            "id": "buffered-inquiry",
+            "listing_id": "buffered-listing",
+            "start_date": start.strftime('%Y-%m-%d'),
+            "end_date": (start + timedelta(days=2)).strftime('%Y-%m-%d'),
+        }
+        self.buffer.submit(inquiry)
+        self.assertIsNone(await self.server.database.inquiries.get(inquiry["id"]))
+        
+        hold = await self.server.hold_inquiry_dates(inquiry["id"])
+        self.assertEqual(hold["inquiry_id"], inquiry["id"])
+        self.assertEqual(hold["status"], "held")
+        print("✅ Hold waited for the buffered inquiry to be written")
+        
+        with self.assertRaises(self.server.HTTPException) as raised:
+            await self.server.hold_inquiry_dates("never-submitted")
+        self.assertEqual(raised.exception.status_code, 404)
+        print("✅ Unknown inquiry still returns 404")
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
\ No newline at end of file